@@ -0,0 +1,333 @@
+from collections import Counter
+from config import (
+    COLUMN_SEVERITY_RISK, COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME, COLUMN_TITLE, COLUMN_DUE_DATE,
+    TOP_N_MODE, HEAVY_HITTERS_CAPACITY, DISTINCT_COUNT_MODE, DISTINCT_EXACT_THRESHOLD, HLL_PRECISION
+)
+from data_processing import GroupIndex, get_host_or_source, is_non_server_vuln, read_csv_data
+from due_dates import DueDateHistogram, today_day
+from distinct import DistinctCounter
+from topn import SpaceSaving
+
+# Heavy-hitters and approximate distinct modes imply each other: with only one of them the other's exact
+# counters would still grow with every host and title
+BOUNDED_COUNTS = TOP_N_MODE == 'heavy_hitters' or DISTINCT_COUNT_MODE == 'approximate'
+# Title and per-priority host counts are kept in bounded Space-Saving summaries
+DEFAULT_TOP_N_CAPACITY = HEAVY_HITTERS_CAPACITY if BOUNDED_COUNTS else None
+# Distinct pairs and hosts are counted with HyperLogLog past this many keys
+DEFAULT_DISTINCT_THRESHOLD = DISTINCT_EXACT_THRESHOLD if BOUNDED_COUNTS else None
+
+# Bumped whenever `to_state` changes shape, so older saved states are rebuilt instead of misread
+STATE_VERSION = 2
+
+class VulnerabilityAggregate:
+    """Every count the report needs, built in a single pass over the vulnerability rows.
+
+    Rows can be fed all at once with `from_rows` or incrementally with `update`, so the
+    same aggregate works for a fully loaded list and for chunks streamed from disk.
+    With `track_offsets` the per-application index also keeps row offsets for drill-down.
+
+    Distinct (title, severity) pairs and hosts are reference-counted so rows can also be
+    taken out again with `remove`, which is what the daily delta refresh relies on.
+
+    With `top_n_capacity` the title and per-priority host counts become `SpaceSaving`
+    summaries holding at most that many keys each; their top-N lists are then estimates
+    with known error bounds. With `distinct_threshold` the distinct pairs and hosts are
+    `DistinctCounter`s, exact up to the threshold and HyperLogLog estimates beyond it.
+    The two are set together, so memory is bounded throughout. Such an aggregate can no
+    longer `remove` rows or be saved.
+    """
+
+    def __init__(self, track_offsets=False, top_n_capacity=DEFAULT_TOP_N_CAPACITY,
+                 distinct_threshold=DEFAULT_DISTINCT_THRESHOLD):
+        if (top_n_capacity is None) != (distinct_threshold is None):
+            raise ValueError("top_n_capacity and distinct_threshold must be set together, or some counts stay unbounded")
+        self.top_n_capacity = top_n_capacity
+        self.distinct_threshold = distinct_threshold
+        self.total = 0
+        self.pair_count = self._distinct_counter()
+        self.host_count = self._distinct_counter()
+        self.priority_count = Counter()
+        self.title_count = self._top_counter()
+        self.hosts_by_priority = {}
+        self.due_dates_by_priority = {}
+        self.due_dates_by_app = {}
+        self.apps = GroupIndex(COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME, track_offsets)
+
+    @classmethod
+    def from_rows(cls, rows, track_offsets=False, top_n_capacity=DEFAULT_TOP_N_CAPACITY,
+                  distinct_threshold=DEFAULT_DISTINCT_THRESHOLD):
+        return cls(track_offsets, top_n_capacity, distinct_threshold).update(rows)
+
+    @classmethod
+    def from_table(cls, table):
+        """Build the aggregate from a `columnar.ColumnarTable` by counting integer codes; always exact."""
+        aggregate = cls(top_n_capacity=None, distinct_threshold=None)
+        severity = table.column(COLUMN_SEVERITY_RISK)
+        titles = table.column(COLUMN_TITLE)
+        app_ids = table.column(COLUMN_APPLICATION_ID)
+        app_names = table.column(COLUMN_APPLICATION_FULL_NAME)
+        priorities = severity.categories
+
+        aggregate.total = len(table)
+        aggregate.priority_count = severity.value_counts()
+        aggregate.title_count = titles.value_counts()
+        aggregate.pair_count = Counter({(titles.categories[title], priorities[priority]): count
+                                        for (title, priority), count in Counter(zip(titles.codes, severity.codes)).items()})
+
+        hosts = table.host_or_source()
+        non_server = table.non_server_mask()
+        for (priority, host), count in Counter(
+                (priority, host) for priority, host, skip in zip(severity.codes, hosts.codes, non_server) if not skip).items():
+            aggregate.hosts_by_priority.setdefault(priorities[priority], Counter())[hosts.categories[host]] = count
+        # Counted in row order rather than summed over priorities, so hosts keep first-seen order
+        aggregate.host_count = Counter({hosts.categories[host]: count for host, count in Counter(
+            host for host, skip in zip(hosts.codes, non_server) if not skip).items()})
+
+        for (priority, day), count in Counter(zip(severity.codes, table.due_days.days)).items():
+            aggregate.due_dates_by_priority.setdefault(priorities[priority], DueDateHistogram()).add_day(day, count)
+        for (app, day), count in Counter(zip(app_ids.codes, table.due_days.days)).items():
+            aggregate.due_dates_by_app.setdefault(app_ids.categories[app], DueDateHistogram()).add_day(day, count)
+
+        # Reversed so the first row of each application wins, as in the row-by-row path
+        first_names = dict(zip(reversed(app_ids.codes), reversed(app_names.codes)))
+        app_priorities = Counter(zip(app_ids.codes, severity.codes))
+        for app, total in Counter(app_ids.codes).items():
+            aggregate.apps.groups[app_ids.categories[app]] = {
+                'name': app_names.categories[first_names[app]],
+                'total': total,
+                'priorities': Counter(),
+                'offsets': None
+            }
+        for (app, priority), count in app_priorities.items():
+            aggregate.apps[app_ids.categories[app]]['priorities'][priorities[priority]] = count
+
+        return aggregate
+
+    def update(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def add(self, row):
+        priority = row[COLUMN_SEVERITY_RISK]
+        title = row[COLUMN_TITLE]
+
+        self.apps.add(self.total, row)
+        self.total += 1
+        if self.distinct_threshold is None:
+            self.pair_count[(title, priority)] += 1
+        else:
+            self.pair_count.add((title, priority))
+        self.priority_count[priority] += 1
+        self.title_count[title] += 1
+
+        if not is_non_server_vuln(row):
+            host = get_host_or_source(row)
+            if self.distinct_threshold is None:
+                self.host_count[host] += 1
+            else:
+                self.host_count.add(host)
+            hosts = self.hosts_by_priority.get(priority)
+            if hosts is None:
+                hosts = self.hosts_by_priority[priority] = self._top_counter()
+            hosts[host] += 1
+
+        due_dates = self.due_dates_by_priority.get(priority)
+        if due_dates is None:
+            due_dates = self.due_dates_by_priority[priority] = DueDateHistogram()
+        due_dates.add(row[COLUMN_DUE_DATE])
+
+        app_due_dates = self.due_dates_by_app.get(row[COLUMN_APPLICATION_ID])
+        if app_due_dates is None:
+            app_due_dates = self.due_dates_by_app[row[COLUMN_APPLICATION_ID]] = DueDateHistogram()
+        app_due_dates.add(row[COLUMN_DUE_DATE])
+
+    def remove(self, row):
+        """Undo `add` for a row that was previously added.
+
+        Keys whose count drops to zero are dropped, so a key that comes back later is ranked
+        after keys with the same count instead of in its original first-seen position.
+        """
+        if not self.exact:
+            raise ValueError("rows cannot be removed from an approximate aggregate")
+        priority = row[COLUMN_SEVERITY_RISK]
+        title = row[COLUMN_TITLE]
+
+        self.apps.remove(row)
+        self.total -= 1
+        decrement(self.pair_count, (title, priority))
+        decrement(self.priority_count, priority)
+        decrement(self.title_count, title)
+
+        if not is_non_server_vuln(row):
+            host = get_host_or_source(row)
+            decrement(self.host_count, host)
+            decrement(self.hosts_by_priority[priority], host)
+
+        self.due_dates_by_priority[priority].remove(row[COLUMN_DUE_DATE])
+        app_due_dates = self.due_dates_by_app[row[COLUMN_APPLICATION_ID]]
+        app_due_dates.remove(row[COLUMN_DUE_DATE])
+        if not app_due_dates.total:
+            del self.due_dates_by_app[row[COLUMN_APPLICATION_ID]]
+
+    def merge(self, other):
+        """Fold in an aggregate built over the rows that follow this one's.
+
+        For exact aggregates, merging shards in file order gives exactly the serial result,
+        including the first-seen order that breaks ties between equal counts. Merged
+        `SpaceSaving` summaries and `DistinctCounter` sketches only stay within their error
+        bounds, so their estimates can differ from a serial pass over the same rows.
+        """
+        self.total += other.total
+        self.pair_count.update(other.pair_count)
+        self.host_count.update(other.host_count)
+        self.priority_count.update(other.priority_count)
+        self.title_count.update(other.title_count)
+        for priority, hosts in other.hosts_by_priority.items():
+            self.hosts_by_priority.setdefault(priority, self._top_counter()).update(hosts)
+        for priority, due_dates in other.due_dates_by_priority.items():
+            self.due_dates_by_priority.setdefault(priority, DueDateHistogram()).update(due_dates)
+        for app_id, due_dates in other.due_dates_by_app.items():
+            self.due_dates_by_app.setdefault(app_id, DueDateHistogram()).update(due_dates)
+        self.apps.merge(other.apps)
+        return self
+
+    def reorder(self, rows):
+        """Put every key in the order `rows` first mention it, as `from_rows(rows)` would.
+
+        `rows` must mention every key the aggregate holds, such as one row per distinct row
+        of the data it counts; the counts themselves are left alone. This restores the
+        first-seen order that breaks ties after `remove` and `add` have moved keys around.
+        """
+        if not self.exact:
+            raise ValueError("an approximate aggregate cannot be reordered")
+        order = VulnerabilityAggregate(top_n_capacity=None, distinct_threshold=None).update(rows)
+        self.pair_count = reordered(self.pair_count, order.pair_count)
+        self.host_count = reordered(self.host_count, order.host_count)
+        self.priority_count = reordered(self.priority_count, order.priority_count)
+        self.title_count = reordered(self.title_count, order.title_count)
+        self.hosts_by_priority = {priority: reordered(self.hosts_by_priority[priority], hosts)
+                                  for priority, hosts in order.hosts_by_priority.items() if priority in self.hosts_by_priority}
+        self.due_dates_by_priority = {priority: reordered_histogram(self.due_dates_by_priority[priority], due_dates)
+                                      for priority, due_dates in order.due_dates_by_priority.items()
+                                      if priority in self.due_dates_by_priority}
+        self.due_dates_by_app = {app_id: reordered_histogram(self.due_dates_by_app[app_id], due_dates)
+                                 for app_id, due_dates in order.due_dates_by_app.items() if app_id in self.due_dates_by_app}
+        groups = self.apps.groups
+        self.apps.groups = {app_id: dict(groups[app_id], name=group['name'],
+                                         priorities=reordered(groups[app_id]['priorities'], group['priorities']))
+                            for app_id, group in order.apps.groups.items() if app_id in groups}
+        return self
+
+    def _top_counter(self):
+        return Counter() if self.top_n_capacity is None else SpaceSaving(self.top_n_capacity)
+
+    def _distinct_counter(self):
+        return Counter() if self.distinct_threshold is None else DistinctCounter(self.distinct_threshold, HLL_PRECISION)
+
+    @property
+    def exact(self):
+        return self.top_n_capacity is None and self.distinct_threshold is None
+
+    def __len__(self):
+        return self.total
+
+    @property
+    def unique_vulnerabilities(self):
+        return len(self.pair_count)
+
+    @property
+    def affected_hosts(self):
+        return len(self.host_count)
+
+    def most_common_titles(self, top_n):
+        return self.title_count.most_common(top_n)
+
+    def top_hosts(self, priority, top_n):
+        return self.hosts_by_priority.get(priority, Counter()).most_common(top_n)
+
+    def top_n_error(self, counter, items):
+        """The most any count in `items` (taken from `counter`) can overstate; 0 when counts are exact."""
+        if not isinstance(counter, SpaceSaving):
+            return 0
+        return max((counter.error(key) for key, _ in items), default=0)
+
+    def apps_by_count(self, top_n=None):
+        """Return (app_id, app) pairs ordered by vulnerability count, ties in first-seen order."""
+        return self.apps.most_common(top_n)
+
+    def past_due(self, today=None):
+        today = today_day() if today is None else today
+        return sum(due_dates.count_before(today) for due_dates in self.due_dates_by_priority.values())
+
+    def app_past_due(self, app_id, today=None):
+        due_dates = self.due_dates_by_app.get(app_id)
+        if due_dates is None:
+            return 0
+        return due_dates.count_before(today_day() if today is None else today)
+
+    def due_date_outlook(self, priority, time_frames, today=None):
+        """Same result shape as `data_processing.get_due_date_outlook`, read from the histograms."""
+        return self.due_dates_by_priority.get(priority, DueDateHistogram()).outlook(time_frames, today)
+
+    def to_state(self):
+        """JSON-serialisable snapshot; key order is kept so ties still rank the same after `from_state`."""
+        if not self.exact:
+            raise ValueError("an approximate aggregate cannot be saved")
+        return {
+            'version': STATE_VERSION,
+            'total': self.total,
+            'pair_count': [[title, priority, count] for (title, priority), count in self.pair_count.items()],
+            'host_count': self.host_count,
+            'priority_count': self.priority_count,
+            'title_count': self.title_count,
+            'hosts_by_priority': self.hosts_by_priority,
+            'due_dates_by_priority': {priority: list(due_dates.counts.items())
+                                      for priority, due_dates in self.due_dates_by_priority.items()},
+            'due_dates_by_app': {app_id: list(due_dates.counts.items())
+                                 for app_id, due_dates in self.due_dates_by_app.items()},
+            'apps': [[app_id, app['name'], app['total'], app['priorities']] for app_id, app in self.apps.groups.items()]
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregate = cls(top_n_capacity=None, distinct_threshold=None)
+        aggregate.total = state['total']
+        aggregate.pair_count = Counter({(title, priority): count for title, priority, count in state['pair_count']})
+        aggregate.host_count = Counter(state['host_count'])
+        aggregate.priority_count = Counter(state['priority_count'])
+        aggregate.title_count = Counter(state['title_count'])
+        aggregate.hosts_by_priority = {priority: Counter(hosts) for priority, hosts in state['hosts_by_priority'].items()}
+        for priority, days in state['due_dates_by_priority'].items():
+            due_dates = aggregate.due_dates_by_priority[priority] = DueDateHistogram()
+            for day, count in days:
+                due_dates.add_day(day, count)
+        for app_id, days in state['due_dates_by_app'].items():
+            due_dates = aggregate.due_dates_by_app[app_id] = DueDateHistogram()
+            for day, count in days:
+                due_dates.add_day(day, count)
+        for app_id, name, total, priorities in state['apps']:
+            aggregate.apps.groups[app_id] = {'name': name, 'total': total, 'priorities': Counter(priorities), 'offsets': None}
+        return aggregate
+
+def reordered(counts, order):
+    """`counts` with its keys in the order they have in `order`."""
+    return Counter({key: counts[key] for key in order if key in counts})
+
+def reordered_histogram(histogram, order):
+    result = DueDateHistogram()
+    result.counts = reordered(histogram.counts, order.counts)
+    result.total = histogram.total
+    return result
+
+def decrement(counter, key):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+def aggregate_csv(file_path, chunk_size):
+    """Stream the CSV in chunks so memory grows with the number of distinct keys, not rows."""
+    aggregate = VulnerabilityAggregate()
+    for chunk in read_csv_data(file_path, chunk_size=chunk_size):
+        aggregate.update(chunk)
+    return aggregate
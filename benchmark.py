@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+import report_generation
+from aggregation import VulnerabilityAggregate, aggregate_csv
+from columnar import read_columnar_data
+from config import CSV_CHUNK_SIZE, CSV_CACHE_SUFFIX, TOP_VULNERABILITIES_COUNT, HEAVY_HITTERS_CAPACITY, DISTINCT_EXACT_THRESHOLD
+from data_processing import read_csv_data, process_rd_csv
+from metrics_store import MetricsStore
+from synthetic_data import generate_vulnerability_csv, generate_deliverables_csv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_DATA_DIR = 'benchmark_data'
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+DEFAULT_TEMPLATE = os.path.join(HERE, 'report_template.html.html')
+DEFAULT_CSS = os.path.join(HERE, 'outlook', 'report_styles.css')
+
+class NullSink:
+    def __init__(self):
+        self.characters = 0
+
+    def write(self, text):
+        self.characters += len(text)
+
+def measure(function, memory):
+    """Run function once for wall/CPU time and, if asked, a second time under tracemalloc for peak memory."""
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    result = function()
+    stats = {
+        'seconds': time.perf_counter() - wall_started,
+        'cpu_seconds': time.process_time() - cpu_started
+    }
+    if memory:
+        del result
+        tracemalloc.start()
+        result = function()
+        stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stats
+
+def remove_cache(path):
+    if os.path.exists(path + CSV_CACHE_SUFFIX):
+        os.remove(path + CSV_CACHE_SUFFIX)
+
+def dataset_paths(data_dir, rows, seed):
+    os.makedirs(data_dir, exist_ok=True)
+    vulnerabilities = os.path.join(data_dir, f'vulnerabilities_{rows}_{seed}.csv')
+    deliverables = os.path.join(data_dir, f'rd_{rows}_{seed}.csv')
+    if not os.path.exists(vulnerabilities):
+        generate_vulnerability_csv(vulnerabilities, rows, seed)
+        remove_cache(vulnerabilities)
+    if not os.path.exists(deliverables):
+        generate_deliverables_csv(deliverables, rows, seed)
+        remove_cache(deliverables)
+    return vulnerabilities, deliverables
+
+def record_metrics(aggregate, deliverables):
+    # The metrics step of main, against a throwaway in-memory history
+    with MetricsStore(':memory:') as store:
+        return store.record_run(aggregate, deliverables)
+
+def run_main(vulnerabilities, deliverables, output_path):
+    try:
+        import main
+    except ImportError as e:
+        return {'skipped': f'main could not be imported: {e}'}
+    saved = (main.CSV_FILE_PATH, main.RD_CSV_FILE_PATH, main.OUTPUT_REPORT_PATH, main.METRICS_STORE_PATH, main.send_email)
+    main.CSV_FILE_PATH, main.RD_CSV_FILE_PATH, main.OUTPUT_REPORT_PATH = vulnerabilities, deliverables, output_path
+    main.METRICS_STORE_PATH = None  # Keep benchmark runs out of the trend history
+    main.send_email = lambda subject, body, recipients, **kwargs: True  # Never email from a benchmark
+    try:
+        return measure(main.main, memory=False)[1]
+    finally:
+        main.CSV_FILE_PATH, main.RD_CSV_FILE_PATH, main.OUTPUT_REPORT_PATH, main.METRICS_STORE_PATH, main.send_email = saved
+
+def benchmark_size(rows, data_dir, seed, memory):
+    vulnerabilities, deliverables = dataset_paths(data_dir, rows, seed)
+    results = {}
+
+    def record(stage, function):
+        result, stats = measure(function, memory)
+        results[stage] = stats
+        print(f"  {stage}: {stats['seconds']:.3f}s"
+              + (f", peak {stats['peak_bytes'] / 2**20:.1f} MiB" if 'peak_bytes' in stats else ''))
+        return result
+
+    remove_cache(vulnerabilities)
+    remove_cache(deliverables)
+    record('read_csv_data_cold_cache', lambda: read_csv_data(vulnerabilities))
+    data = record('read_csv_data_warm_cache', lambda: read_csv_data(vulnerabilities))
+    record('read_columnar_data', lambda: read_columnar_data(vulnerabilities))
+    rd_data, owner_summary = record('process_rd_csv', lambda: process_rd_csv(deliverables))
+    aggregate = record('aggregate_rows', lambda: VulnerabilityAggregate.from_rows(data))
+    record('aggregate_streaming', lambda: aggregate_csv(vulnerabilities, CSV_CHUNK_SIZE))
+    approximate = record('aggregate_approximate', lambda: VulnerabilityAggregate.from_rows(
+        data, top_n_capacity=HEAVY_HITTERS_CAPACITY, distinct_threshold=DISTINCT_EXACT_THRESHOLD))
+    del data
+    record('record_metrics', lambda: record_metrics(aggregate, rd_data))
+    record('record_metrics_approximate', lambda: record_metrics(approximate, rd_data))
+
+    sections = {
+        'executive_summary': lambda: report_generation.iter_executive_summary(aggregate),
+        'most_common_vulnerabilities': lambda: report_generation.iter_html_list(
+            aggregate.most_common_titles(TOP_VULNERABILITIES_COUNT)),
+        'vulnerable_hosts_by_priority': lambda: report_generation.iter_vulnerable_hosts_by_priority(aggregate),
+        'due_dates_by_priority': lambda: report_generation.iter_due_dates_by_priority(aggregate),
+        'vulnerabilities_by_app': lambda: report_generation.iter_vulnerabilities_by_app(aggregate),
+        'app_deliverables': lambda: report_generation.iter_app_deliverables_html(rd_data, owner_summary)
+    }
+    for name, section in sections.items():
+        record(f'section_{name}', lambda section=section: "".join(section()))
+    record('render_template', lambda: report_generation.write_html_report(NullSink(), aggregate, rd_data, owner_summary))
+
+    results['main'] = run_main(vulnerabilities, deliverables, os.path.join(data_dir, f'report_{rows}.html'))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous_path, current):
+    """Print the wall-time ratio of every stage against an earlier results file."""
+    with open(previous_path, 'r') as f:
+        previous = json.load(f)
+    print(f"Compared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for rows, stages in current['results'].items():
+        for stage, stats in stages.items():
+            before = previous['results'].get(rows, {}).get(stage, {})
+            if 'seconds' in stats and before.get('seconds'):
+                print(f"  {rows} {stage}: {stats['seconds'] / before['seconds']:.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory-profile the report pipeline on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help='also measure peak memory (runs each stage twice)')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE)
+    parser.add_argument('--css', default=DEFAULT_CSS)
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    # The report module imported the template paths from config; point them at the repository files
+    report_generation.HTML_TEMPLATE_PATH = args.template
+    report_generation.CSS_STYLE_PATH = args.css
+
+    run = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {}
+    }
+    for rows in args.sizes:
+        print(f"{rows} rows:")
+        run['results'][str(rows)] = benchmark_size(rows, args.data_dir, args.seed, args.memory)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    results_path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{run['commit'] or 'unknown'}.json")
+    with open(results_path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results saved to {results_path}")
+
+    if args.compare:
+        compare(args.compare, run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import csv
+import os
+
+SUMMARY_COLUMNS = [
+    "Date",
+    "New Records",
+    "Carryover Records",
+    "Deleted Records",
+    "Modified Records",
+]
+
+# Line endings as pandas' to_csv writes them, which earlier summaries were saved with
+LINE_TERMINATOR = os.linesep
+
+
+def append_summaries(summary_file_path, summaries):
+    """Append summary rows, writing the header first if the file is new.
+
+    A file written before "Modified Records" existed is rewritten once under the
+    current header: its rows keep their values and leave the new columns empty. Rows
+    that were already appended under the old header with the extra column are kept
+    in the current column order, so such a file is repaired too.
+    """
+    header = None
+    if os.path.exists(summary_file_path):
+        with open(summary_file_path, newline="") as file:
+            header = next(csv.reader(file), None)
+    if header is not None and header != SUMMARY_COLUMNS:
+        migrate_summary_file(summary_file_path, header)
+        header = SUMMARY_COLUMNS
+
+    with open(summary_file_path, "a", newline="") as file:
+        writer = csv.DictWriter(
+            file, SUMMARY_COLUMNS, restval="", lineterminator=LINE_TERMINATOR
+        )
+        if header is None:
+            writer.writeheader()
+        writer.writerows(summaries)
+
+
+def migrate_summary_file(summary_file_path, header):
+    with open(summary_file_path, newline="") as file:
+        reader = csv.reader(file)
+        next(reader)
+        rows = [
+            dict(zip(header if len(row) <= len(header) else SUMMARY_COLUMNS, row))
+            for row in reader
+            if row
+        ]
+    temporary = summary_file_path + ".tmp"
+    with open(temporary, "w", newline="") as file:
+        writer = csv.DictWriter(
+            file,
+            SUMMARY_COLUMNS,
+            restval="",
+            extrasaction="ignore",
+            lineterminator=LINE_TERMINATOR,
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temporary, summary_file_path)
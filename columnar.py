@@ -0,0 +1,185 @@
+import csv
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+from config import COLUMN_SEVERITY_RISK, COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME, COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_TITLE, COLUMN_DUE_DATE, CSV_CACHE_ENABLED
+from csv_cache import read_cached_columns
+from data_processing import read_csv_data
+from due_dates import parse_due_day
+
+CATEGORICAL_COLUMNS = [
+    COLUMN_SEVERITY_RISK,
+    COLUMN_APPLICATION_ID,
+    COLUMN_APPLICATION_FULL_NAME,
+    COLUMN_HOST_NAME,
+    COLUMN_SOURCES,
+    COLUMN_TITLE
+]
+
+NON_SERVER_LABEL = "Non-Server Vuln"
+
+class CategoricalColumn:
+    """Dictionary-encoded string column: one uint32 code per row plus the distinct values.
+
+    Codes are handed out in first-seen order, so counting codes in row order gives the same
+    tie-breaking as counting the original strings.
+    """
+
+    def __init__(self, categories=None, codes=None):
+        self.categories = list(categories or [])
+        self.codes = codes if codes is not None else array('I')
+        self._lookup = {value: code for code, value in enumerate(self.categories)}
+
+    def append(self, value):
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def code_of(self, value):
+        return self._lookup.get(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+    def value_counts(self):
+        counts = Counter(self.codes)
+        return Counter({self.categories[code]: count for code, count in counts.items()})
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(sys.getsizeof(value) for value in self.categories)
+
+class DayColumn:
+    """Due dates stored as int32 proleptic-Gregorian day numbers (`date.toordinal()`)."""
+
+    def __init__(self, days=None):
+        self.days = days if days is not None else array('i')
+
+    def append(self, date_string):
+        self.days.append(parse_due_day(date_string))
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, index):
+        return self.days[index]
+
+    def nbytes(self):
+        return self.days.itemsize * len(self.days)
+
+class ColumnarTable:
+    """The configured vulnerability columns held as compact typed arrays."""
+
+    def __init__(self, columns, due_days):
+        self.columns = columns
+        self.due_days = due_days
+
+    def __len__(self):
+        return len(self.due_days)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def non_server_mask(self):
+        """One byte per row, 1 where the row has neither a host name nor a source."""
+        host_empty = self.columns[COLUMN_HOST_NAME].code_of('')
+        source_empty = self.columns[COLUMN_SOURCES].code_of('')
+        if host_empty is None or source_empty is None:
+            return bytes(len(self))
+        return bytes(host == host_empty and source == source_empty
+                     for host, source in zip(self.columns[COLUMN_HOST_NAME].codes, self.columns[COLUMN_SOURCES].codes))
+
+    def host_or_source(self):
+        """Column form of `data_processing.get_host_or_source`, resolved once per distinct (host, source) pair."""
+        hosts = self.columns[COLUMN_HOST_NAME]
+        sources = self.columns[COLUMN_SOURCES]
+        result = CategoricalColumn()
+        resolved = {}
+        for pair in zip(hosts.codes, sources.codes):
+            label = resolved.get(pair)
+            if label is None:
+                host, source = hosts.categories[pair[0]], sources.categories[pair[1]]
+                label = resolved[pair] = host or source or NON_SERVER_LABEL
+            result.append(label)
+        return result
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values()) + self.due_days.nbytes()
+
+def read_columnar_data(file_path):
+    if CSV_CACHE_ENABLED:
+        cached = read_cached_columns(file_path)
+        if cached is not None:
+            return table_from_cached_columns(cached[1], cached[2])
+    columns = {name: CategoricalColumn() for name in CATEGORICAL_COLUMNS}
+    due_days = DayColumn()
+    with open(file_path, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        positions = [(header.index(name), column.append) for name, column in columns.items()]
+        due_position = header.index(COLUMN_DUE_DATE)
+        append_day = due_days.append
+        for record in reader:
+            for position, append in positions:
+                append(record[position])
+            append_day(record[due_position])
+    return ColumnarTable(columns, due_days)
+
+def table_from_cached_columns(cached, typed):
+    columns = {name: CategoricalColumn(*cached[name]) for name in CATEGORICAL_COLUMNS}
+    if COLUMN_DUE_DATE in typed:
+        # Already parsed into day numbers when the cache was built
+        return ColumnarTable(columns, DayColumn(typed[COLUMN_DUE_DATE]))
+    due_strings, due_codes = cached[COLUMN_DUE_DATE]
+    # Each distinct due date string is parsed once, then mapped onto the codes
+    due_days = DayColumn(array('i', map([parse_due_day(value) for value in due_strings].__getitem__, due_codes)))
+    return ColumnarTable(columns, due_days)
+
+def compare_with_dict_rows(file_path):
+    """Measure load time, peak allocation and aggregation time for both in-memory layouts."""
+    from aggregation import VulnerabilityAggregate
+
+    results = {}
+    for name, load, build in [
+        ('dict_rows', read_csv_data, VulnerabilityAggregate.from_rows),
+        ('columnar', read_columnar_data, VulnerabilityAggregate.from_table)
+    ]:
+        started = time.perf_counter()
+        data = load(file_path)
+        loaded = time.perf_counter()
+        build(data)
+        aggregated = time.perf_counter()
+        rows = len(data)
+        del data
+
+        # Memory is measured on a second load so tracing overhead does not skew the timings
+        tracemalloc.start()
+        data = load(file_path)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+
+        results[name] = {
+            'rows': rows,
+            'load_seconds': loaded - started,
+            'aggregate_seconds': aggregated - loaded,
+            'retained_bytes': retained,
+            'peak_bytes': peak
+        }
+    return results
+
+if __name__ == "__main__":
+    for name, stats in compare_with_dict_rows(sys.argv[1]).items():
+        print(f"{name}: {stats['rows']} rows, load {stats['load_seconds']:.2f}s, "
+              f"aggregate {stats['aggregate_seconds']:.2f}s, retained {stats['retained_bytes'] / 2**20:.1f} MiB, "
+              f"peak {stats['peak_bytes'] / 2**20:.1f} MiB")
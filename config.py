@@ -3,16 +3,85 @@ CSV_FILE_PATH = 'path_to_your_csv_file.csv'
 HTML_TEMPLATE_PATH = 'report_template.html'
 CSS_STYLE_PATH = 'report_styles.css'
 OUTPUT_REPORT_PATH = 'security_report.html'
+TEMPLATE_BYTECODE_CACHE_DIR = '.template_cache'
 RD_CSV_FILE_PATH = 'rd.csv'  # Add this line
 
+# Instrumentation: per-stage timings written as a JSON run log and optionally a Chrome trace
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_TRACE_MEMORY = False  # tracemalloc peaks per stage; slows the run noticeably
+RUN_LOG_PATH = 'run_log.json'
+CHROME_TRACE_PATH = None  # e.g. 'run_trace.json'
+
 # Email settings
 EMAIL_RECIPIENTS = ['recipient1@example.com', 'recipient2@example.com']
 EMAIL_SUBJECT = 'Security Vulnerability Summary Report'
+EMAIL_SENDER = 'security-reports@example.com'
+
+# Mail transport: 'outlook' (local Outlook client), 'smtp', or 'maildir' (writes to MAILDIR_PATH instead of sending)
+MAIL_TRANSPORT = 'outlook'
+SMTP_HOST = 'localhost'
+SMTP_PORT = 25
+SMTP_TIMEOUT_SECONDS = 60  # For connecting and for each reply, so an unresponsive server cannot block a sender
+SMTP_USE_TLS = False
+SMTP_USERNAME = None
+SMTP_PASSWORD = None
+MAILDIR_PATH = 'outbox'
+
+# Concurrent senders for batches of messages, and the on-disk spool failed messages wait in
+MAIL_WORKERS = 4
+MAIL_SPOOL_DIR = 'mail_spool'
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_DELAY_SECONDS = 300  # Doubles after every failed attempt
 
 # Report settings
 TOP_VULNERABILITIES_COUNT = 5
 TOP_SERVERS_COUNT = 5
 TOP_APP_IDS_COUNT = 5
+APPLICATION_RISK_COUNT = 10
+
+# 'exact' keeps every title and host count; 'heavy_hitters' keeps at most HEAVY_HITTERS_CAPACITY per list and
+# reports the top titles/hosts (and the per-host metrics history) as estimates with error bounds
+TOP_N_MODE = 'exact'
+HEAVY_HITTERS_CAPACITY = 10000
+
+# 'exact' keeps every distinct (title, severity) pair and host; 'approximate' switches to a HyperLogLog sketch
+# of 2**HLL_PRECISION registers past DISTINCT_EXACT_THRESHOLD keys.
+# Either non-exact mode turns on the other, so no count grows with the data. The resulting aggregate cannot
+# remove rows or be saved with `to_state`, so main() refuses to run either mode with INCREMENTAL_MODE
+DISTINCT_COUNT_MODE = 'exact'
+DISTINCT_EXACT_THRESHOLD = 100000
+HLL_PRECISION = 14
+
+# Streaming mode aggregates the vulnerability CSV chunk by chunk instead of loading every row
+STREAMING_MODE = False
+CSV_CHUNK_SIZE = 50000
+
+# Worker processes for sharded aggregation of the vulnerability CSV; 1 keeps it in this process
+AGGREGATION_WORKERS = 1
+
+# Parsed CSV columns are cached next to the source file as <file><suffix>
+CSV_CACHE_ENABLED = True
+CSV_CACHE_SUFFIX = '.cache'
+
+# Incremental mode applies only the rows that changed since the previous export to a saved aggregate;
+# the state file keeps the aggregate and a compact index of the rows it was built from
+INCREMENTAL_MODE = False
+AGGREGATE_STATE_PATH = 'aggregate_state.json'
+
+# Fan-out mode writes one report per application ('application') or per deliverable owner ('owner')
+FANOUT_PARTITION = 'application'
+FANOUT_OUTPUT_DIR = 'partition_reports'
+FANOUT_WORKERS = 4
+# Recipients of each partition's report, keyed by application ID or owner; unlisted partitions are not mailed
+FANOUT_RECIPIENTS = {}
+
+# Set to a SQLite path (e.g. 'metrics_history.sqlite') to append each run's metrics to a history and show the
+# last TREND_RUNS runs in the report; None keeps it off
+METRICS_STORE_PATH = None
+TREND_RUNS = 8
+
+# Format of the Due Date column
+DUE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 # Time frames for due date outlook (in days)
 DUE_DATE_TIME_FRAMES = [10, 30, 45, 60, 100, 180]
@@ -26,5 +95,8 @@ COLUMN_SOURCES = 'Sources'
 COLUMN_TITLE = 'Title'
 COLUMN_DUE_DATE = 'Due Date'
 
+# Columns that identify the same vulnerability across daily exports
+ROW_IDENTITY_COLUMNS = [COLUMN_APPLICATION_ID, COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_TITLE]
+
 # Priority levels
 PRIORITY_LEVELS = ['Priority 1', 'Priority 2', 'Priority 3']
@@ -0,0 +1,162 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+HEADER_PREFIX = "Here are all the records for "
+OUTPUT_CHUNK_SIZE = 100_000
+
+
+def output_dtypes(frame):
+    """Nullable "Int64" for each integer column, so the header rows' missing values do not
+    turn ids into floats; every other column keeps the dtype it was read with."""
+    return {
+        column: "Int64"
+        for column, dtype in frame.dtypes.items()
+        if pd.api.types.is_integer_dtype(dtype)
+    }
+
+
+def new_customers_by_country(new_records, seen_countries, dtypes=None):
+    """The new records sorted by country, with a header row before each country not seen yet.
+
+    The countries are factorized once (as groupby does) and the rows ordered by their
+    codes, which gives every country's block of rows without filtering the frame once per
+    country; the header rows are then placed in front of their blocks by index position.
+    Countries that got a header row are added to `seen_countries`. Records without a
+    country come last, without a header.
+
+    Columns are cast to `dtypes` first, by default `output_dtypes(new_records)`; a
+    chunked write passes the same mapping for every chunk so they all format alike.
+    """
+    if dtypes is None:
+        dtypes = output_dtypes(new_records)
+    new_records = new_records.astype(dtypes)
+    codes, countries = pd.factorize(new_records["Country"], sort=True)
+    codes = np.where(codes < 0, len(countries), codes)
+    order = np.argsort(codes, kind="stable")
+    sorted_records = new_records.take(order).reset_index(drop=True)
+    sorted_codes = codes[order]
+
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    starts = starts[sorted_codes[starts] < len(countries)]
+    block_countries = pd.Series(countries[sorted_codes[starts]], index=starts)
+    header_countries = block_countries[~block_countries.isin(seen_countries)]
+    seen_countries.update(header_countries)
+
+    columns = ["Country"] + [
+        column for column in sorted_records.columns if column != "Country"
+    ]
+    if header_countries.empty:
+        return sorted_records[columns]
+    headers = pd.DataFrame(
+        {"Country": (HEADER_PREFIX + header_countries.astype(str)).to_numpy()},
+        index=header_countries.index - 0.5,
+    )
+    output = pd.concat([headers, sorted_records]).sort_index(kind="stable")
+    return output[columns].reset_index(drop=True)
+
+
+def write_new_customers_by_country(new_records, seen_countries, output_file_path):
+    output = new_customers_by_country(new_records, seen_countries)
+    output.to_csv(output_file_path, index=False, chunksize=OUTPUT_CHUNK_SIZE)
+    return len(output)
+
+
+def write_new_customers_by_country_chunks(
+    chunks, seen_countries, output_file_path, dtypes
+):
+    """`write_new_customers_by_country` for new records already sorted by country, in chunks.
+
+    A country continuing from the previous chunk is already in `seen_countries`, so it
+    does not get a second header row. `dtypes` is decided once for the whole file (see
+    `CustomerStore.column_dtypes`), since one chunk's values cannot tell whether a column
+    is an integer column or only happens to hold whole numbers there.
+    """
+    rows = 0
+    with open(output_file_path, "w", newline="") as file:
+        for index, new_records in enumerate(chunks):
+            output = new_customers_by_country(new_records, seen_countries, dtypes)
+            output.to_csv(file, index=False, header=index == 0)
+            rows += len(output)
+    return rows
+
+
+def legacy_new_customers_by_country(new_records, seen_countries):
+    # The per-country filtering loop io2.py used before, kept to benchmark against
+    sorted_new_records = new_records.sort_values(by="Country")
+    output_data = []
+    for country in sorted_new_records["Country"].unique():
+        if country not in seen_countries:
+            output_data.append({"Country": f"{HEADER_PREFIX}{country}"})
+            seen_countries.add(country)
+        country_data = sorted_new_records[sorted_new_records["Country"] == country]
+        output_data.extend(country_data.to_dict(orient="records"))
+    return pd.DataFrame(output_data)
+
+
+def synthetic_customers(rows, countries, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Country {index:04d}" for index in range(countries)])
+    return pd.DataFrame(
+        {
+            "Customer Id": np.arange(rows),
+            "First Name": rng.choice(["John", "Jane", "Mike", "Alice", "Bob"], rows),
+            "Company": "Company" + pd.Series(rng.integers(0, 1000, rows)).astype(str),
+            "Country": names[rng.integers(0, countries, rows)],
+            "Email": "customer" + pd.Series(np.arange(rows)).astype(str) + "@example.com",
+        }
+    )
+
+
+def benchmark(sizes, countries, legacy_limit):
+    """Seconds to build and write the output for each (rows, countries) combination."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        output_file_path = os.path.join(directory, "output.csv")
+        for rows in sizes:
+            for country_count in countries:
+                new_records = synthetic_customers(rows, country_count)
+                started = time.perf_counter()
+                write_new_customers_by_country(new_records, set(), output_file_path)
+                seconds = time.perf_counter() - started
+                legacy_seconds = None
+                if rows * country_count <= legacy_limit:
+                    started = time.perf_counter()
+                    legacy_new_customers_by_country(new_records, set()).to_csv(
+                        output_file_path, index=False
+                    )
+                    legacy_seconds = time.perf_counter() - started
+                results.append((rows, country_count, seconds, legacy_seconds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the new-customers-by-country output on synthetic data."
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 5_000_000]
+    )
+    parser.add_argument("--countries", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument(
+        "--legacy-limit",
+        type=int,
+        default=50_000_000,
+        help="skip the old loop when rows x countries exceeds this",
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'countries':>9} {'seconds':>9} {'old loop':>9}")
+    for rows, country_count, seconds, legacy_seconds in benchmark(
+        args.sizes, args.countries, args.legacy_limit
+    ):
+        legacy = "skipped" if legacy_seconds is None else f"{legacy_seconds:.2f}"
+        print(f"{rows:>10} {country_count:>9} {seconds:>9.2f} {legacy:>9}")
+
+
+if __name__ == "__main__":
+    main()
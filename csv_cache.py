@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from config import CSV_CACHE_SUFFIX, COLUMN_DUE_DATE
+from due_dates import parse_due_day
+
+MAGIC = b'IO2CSVCACHE2\n'
+HEADER_LENGTH = struct.Struct('<Q')
+HASH_BLOCK_SIZE = 1 << 20
+
+# Columns also stored parsed, as (array typecode, parser of one value)
+TYPED_COLUMNS = {
+    COLUMN_DUE_DATE: ('i', parse_due_day)
+}
+
+def cache_path(file_path):
+    return file_path + CSV_CACHE_SUFFIX
+
+def file_stat(file_path):
+    stat = os.stat(file_path)
+    return {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+def content_hash(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_signature(file_path):
+    return {**file_stat(file_path), 'hash': content_hash(file_path)}
+
+def encode_csv(file_path):
+    """Dictionary-encode every column of the CSV; None if a row does not match the header."""
+    with open(file_path, 'r') as f:
+        reader = csv.reader(f)
+        try:
+            fieldnames = next(reader)
+        except StopIteration:
+            return [], {}, {}
+        lookups = [{} for _ in fieldnames]
+        categories = [[] for _ in fieldnames]
+        codes = [array('I') for _ in fieldnames]
+        width = len(fieldnames)
+        for record in reader:
+            if not record:
+                continue
+            if len(record) != width:
+                return None
+            for value, lookup, values, column in zip(record, lookups, categories, codes):
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(values)
+                    values.append(value)
+                column.append(code)
+    columns = {name: (categories[i], codes[i]) for i, name in enumerate(fieldnames)}
+    return fieldnames, columns, typed_columns(columns)
+
+def typed_columns(columns):
+    """Parsed arrays of the `TYPED_COLUMNS` present; a column with an unparsable value is left out."""
+    typed = {}
+    for name, (typecode, parse) in TYPED_COLUMNS.items():
+        if name not in columns:
+            continue
+        categories, codes = columns[name]
+        try:
+            # Each distinct value is parsed once, then mapped onto the codes
+            parsed = [parse(value) for value in categories]
+        except ValueError:
+            continue
+        typed[name] = array(typecode, map(parsed.__getitem__, codes))
+    return typed
+
+def write_cache(file_path, signature, fieldnames, columns, typed):
+    header = {
+        'signature': signature,
+        'byteorder': sys.byteorder,
+        'fieldnames': fieldnames,
+        'columns': [{'name': name, 'categories': values, 'typecode': codes.typecode, 'length': len(codes)}
+                    for name, (values, codes) in columns.items()],
+        'typed': [{'name': name, 'typecode': values.typecode, 'length': len(values)}
+                  for name, values in typed.items()]
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    target = cache_path(file_path)
+    # A unique temporary name, so processes rebuilding the same cache do not write into each other's file
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(target) or '.',
+                                     prefix=os.path.basename(target) + '.', suffix='.tmp', delete=False) as f:
+        try:
+            f.write(MAGIC)
+            f.write(HEADER_LENGTH.pack(len(header_bytes)))
+            f.write(header_bytes)
+            for _, codes in columns.values():
+                codes.tofile(f)
+            for values in typed.values():
+                values.tofile(f)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, target)
+
+def read_cache(file_path):
+    """(signature, fieldnames, columns, typed) from the cache file, or None if it is missing or unreadable."""
+    try:
+        with open(cache_path(file_path), 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (header_length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+            header = json.loads(f.read(header_length))
+            if header['byteorder'] != sys.byteorder:
+                return None
+            columns = {}
+            for column in header['columns']:
+                codes = array(column['typecode'])
+                codes.fromfile(f, column['length'])
+                columns[column['name']] = (column['categories'], codes)
+            typed = {}
+            for column in header['typed']:
+                values = array(column['typecode'])
+                values.fromfile(f, column['length'])
+                typed[column['name']] = values
+    except (OSError, ValueError, KeyError, EOFError, struct.error):
+        return None
+    return header['signature'], header['fieldnames'], columns, typed
+
+def read_cached_columns(file_path):
+    """(fieldnames, {name: (categories, codes)}, {name: parsed array}) for the CSV, rebuilding the cache when stale.
+
+    The cache sits next to the source file. It is used as is while the file's path, size and
+    mtime match; when they differ the file is hashed, and the cache is still used (and its
+    signature refreshed) if the content is unchanged. None means the file cannot be encoded
+    losslessly and should be read as plain CSV.
+    """
+    stat = file_stat(file_path)
+    cached = read_cache(file_path)
+    if cached is not None:
+        signature, fieldnames, columns, typed = cached
+        if all(signature.get(name) == value for name, value in stat.items()):
+            return fieldnames, columns, typed
+        digest = content_hash(file_path)
+        if signature.get('hash') == digest:
+            try:
+                write_cache(file_path, {**stat, 'hash': digest}, fieldnames, columns, typed)
+            except OSError:
+                pass
+            return fieldnames, columns, typed
+    else:
+        digest = content_hash(file_path)
+    encoded = encode_csv(file_path)
+    if encoded is None:
+        return None
+    try:
+        write_cache(file_path, {**stat, 'hash': digest}, *encoded)
+    except OSError:
+        pass  # A read-only source directory just means no cache
+    return encoded
+
+def rows_from_columns(fieldnames, columns):
+    """Rebuild `csv.DictReader`-style rows; equal values share one string object."""
+    values = [map(columns[name][0].__getitem__, columns[name][1]) for name in fieldnames]
+    return [dict(zip(fieldnames, record)) for record in zip(*values)]
@@ -0,0 +1,351 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMN = "Customer Id"
+FINGERPRINT_COLUMN = "_fingerprint"
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def fingerprints(frame, columns):
+    """A 64-bit hash of each row's `columns`, as signed integers SQLite can store.
+
+    Numbers are hashed as floats so a column read as int one day and as float the next
+    (because it gained a missing value) does not make every row look modified.
+    """
+    values = frame[columns]
+    numeric = values.select_dtypes("number").columns
+    if len(numeric):
+        values = values.astype({column: "float64" for column in numeric})
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().view("int64")
+
+
+def sql_rows(frame):
+    # sqlite3 only binds plain Python values, and missing values must become NULL
+    values = frame.astype(object).where(frame.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+class CustomerStore:
+    """The accumulated customers in SQLite, keyed by `Customer Id`.
+
+    `sync` makes the store match a daily file by inserting new customers, updating
+    carried-over customers whose values changed and deleting the ones that are gone,
+    so rows that did not change are never rewritten. Each row is stored with a
+    fingerprint of its non-key columns, and changes are found by comparing those.
+    """
+
+    def __init__(self, path, key_column=KEY_COLUMN):
+        self.path = path
+        self.key_column = key_column
+        self.connection = sqlite3.connect(path)
+        self.columns = self._stored_columns()
+
+    @classmethod
+    def in_memory(cls, path=None, key_column=KEY_COLUMN):
+        """A store held in memory, starting as a copy of the store at `path` if there is one.
+
+        Nothing reaches the disk until `save`, so many syncs can run against it and be
+        persisted once.
+        """
+        store = cls(":memory:", key_column)
+        if path is not None and os.path.exists(path):
+            with closing(sqlite3.connect(path)) as source:
+                source.backup(store.connection)
+            store.columns = store._stored_columns()
+        return store
+
+    def save(self, path):
+        """Write the whole store to `path`, replacing what is there."""
+        with closing(sqlite3.connect(path)) as target:
+            self.connection.backup(target)
+
+    def _stored_columns(self):
+        rows = self.connection.execute("PRAGMA table_info(customers)").fetchall()
+        columns = [row[1] for row in sorted(rows, key=lambda row: row[0])]
+        if columns and FINGERPRINT_COLUMN not in columns:
+            self._add_fingerprints(columns)
+        else:
+            columns = [column for column in columns if column != FINGERPRINT_COLUMN]
+        return columns
+
+    @property
+    def value_columns(self):
+        return [column for column in self.columns if column != self.key_column]
+
+    def _add_fingerprints(self, columns):
+        # Stores written before fingerprints existed get them computed once
+        self.columns = columns
+        stored = self.to_frame()
+        with self.connection:
+            self.connection.execute(
+                f"ALTER TABLE customers ADD COLUMN {quote(FINGERPRINT_COLUMN)}"
+            )
+            self.connection.executemany(
+                f"UPDATE customers SET {quote(FINGERPRINT_COLUMN)} = ? "
+                f"WHERE {quote(self.key_column)} = ?",
+                zip(
+                    fingerprints(stored, self.value_columns).tolist(),
+                    (value for value, in sql_rows(stored[[self.key_column]])),
+                ),
+            )
+
+    def _create(self, columns):
+        if self.key_column not in columns:
+            raise ValueError(f"the customer data has no {self.key_column!r} column")
+        definitions = [
+            f"{quote(column)} PRIMARY KEY" if column == self.key_column else quote(column)
+            for column in columns
+        ]
+        definitions.append(f"{quote(FINGERPRINT_COLUMN)} INTEGER")
+        # No declared types, so ids and values keep the types pandas read them with
+        self.connection.execute(
+            f"CREATE TABLE customers ({', '.join(definitions)}) WITHOUT ROWID"
+        )
+        self.columns = list(columns)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return self.connection.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+
+    def import_csv(self, csv_path, chunk_size=None):
+        """Load an existing accumulated_customers.csv into an empty store, once."""
+        if self.columns or not os.path.exists(csv_path):
+            return False
+        chunks = (
+            pd.read_csv(csv_path, chunksize=chunk_size)
+            if chunk_size
+            else [pd.read_csv(csv_path)]
+        )
+        with self.connection:
+            for accumulated_data in chunks:
+                if not self.columns:
+                    self._create(accumulated_data.columns)
+                self._upsert(
+                    accumulated_data, fingerprints(accumulated_data, self.value_columns)
+                )
+        return True
+
+    def _upsert(self, frame, row_fingerprints):
+        columns = self.columns + [FINGERPRINT_COLUMN]
+        names = ", ".join(quote(column) for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        assignments = ", ".join(
+            f"{quote(column)} = excluded.{quote(column)}"
+            for column in self.value_columns + [FINGERPRINT_COLUMN]
+        )
+        rows = frame[self.columns].assign(**{FINGERPRINT_COLUMN: row_fingerprints})
+        self.connection.executemany(
+            f"INSERT INTO customers ({names}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({quote(self.key_column)}) DO UPDATE SET {assignments}",
+            sql_rows(rows),
+        )
+
+    def sync(self, new_data):
+        """Make the store hold exactly `new_data`'s customers.
+
+        Returns the (new, carryover, modified, deleted) records: the split io2.py
+        reports, plus the carryover records whose values changed since the last sync.
+        Only new and modified records are written.
+        """
+        if not self.columns:
+            with self.connection:
+                self._create(new_data.columns)
+                self._upsert(new_data, fingerprints(new_data, self.value_columns))
+            empty = new_data.iloc[0:0]
+            return new_data, empty, empty, pd.DataFrame(columns=self.columns)
+        if list(new_data.columns) != self.columns:
+            raise ValueError(
+                f"the daily file's columns {list(new_data.columns)} differ from the store's {self.columns}"
+            )
+
+        key = quote(self.key_column)
+        row_fingerprints = fingerprints(new_data, self.value_columns)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS todays_ids (id PRIMARY KEY) WITHOUT ROWID"
+            )
+            self.connection.execute("DELETE FROM todays_ids")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO todays_ids VALUES (?)",
+                ((value,) for value, in sql_rows(new_data[[self.key_column]])),
+            )
+
+            stored_fingerprints = dict(
+                self.connection.execute(
+                    f"SELECT id, customers.{quote(FINGERPRINT_COLUMN)} "
+                    f"FROM todays_ids JOIN customers ON customers.{key} = todays_ids.id"
+                )
+            )
+            ids = new_data[self.key_column]
+            is_carryover = ids.isin(list(stored_fingerprints))
+            is_modified = is_carryover & (
+                ids.map(stored_fingerprints).to_numpy() != row_fingerprints
+            )
+            new_records = new_data[~is_carryover]
+            carryover_records = new_data[is_carryover]
+            modified_records = new_data[is_modified]
+
+            deleted_records = pd.read_sql_query(
+                f"SELECT * FROM customers WHERE {key} NOT IN (SELECT id FROM todays_ids)",
+                self.connection,
+            ).drop(columns=FINGERPRINT_COLUMN)
+            self.connection.execute(
+                f"DELETE FROM customers WHERE {key} NOT IN (SELECT id FROM todays_ids)"
+            )
+            # A customer listed twice keeps its last row, as the primary key allows one
+            is_written = (~is_carryover | is_modified) & ~ids.duplicated(keep="last")
+            self._upsert(new_data[is_written], row_fingerprints[is_written.to_numpy()])
+
+        return new_records, carryover_records, modified_records, deleted_records
+
+    def _stored_keys(self):
+        # Sorted ids and their fingerprints: 16 bytes per customer, searched with
+        # np.searchsorted instead of loading the rows
+        key = quote(self.key_column)
+        if self.connection.execute(
+            f"SELECT 1 FROM customers WHERE typeof({key}) != 'integer' LIMIT 1"
+        ).fetchone():
+            raise ValueError(f"chunked syncs need integer {self.key_column!r} values")
+        keys = np.fromiter(
+            self.connection.execute(
+                f"SELECT {key}, {quote(FINGERPRINT_COLUMN)} FROM customers ORDER BY {key}"
+            ),
+            dtype=[("id", "int64"), ("fingerprint", "int64")],
+        )
+        return keys["id"], keys["fingerprint"]
+
+    def sync_chunks(self, chunks):
+        """`sync` for a daily file read in chunks, with memory bounded by the chunk size.
+
+        Membership is looked up in the sorted array of stored ids, the only per-customer
+        state kept in memory. The day's new customers are remembered in a temporary
+        table for `iter_new_records`. Returns the (new, carryover, modified, deleted)
+        record counts.
+        """
+        key = quote(self.key_column)
+        counts = {"new": 0, "carryover": 0, "modified": 0, "deleted": 0}
+        stored_ids = stored_fingerprints = None
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS new_ids "
+                "(position INTEGER PRIMARY KEY, id UNIQUE)"
+            )
+            self.connection.execute("DELETE FROM new_ids")
+            for chunk in chunks:
+                if not self.columns:
+                    self._create(chunk.columns)
+                if list(chunk.columns) != self.columns:
+                    raise ValueError(
+                        f"the daily file's columns {list(chunk.columns)} differ from the store's {self.columns}"
+                    )
+                if not pd.api.types.is_integer_dtype(chunk[self.key_column]):
+                    raise ValueError(
+                        f"chunked syncs need integer {self.key_column!r} values"
+                    )
+                if stored_ids is None:
+                    stored_ids, stored_fingerprints = self._stored_keys()
+                    seen = np.zeros(len(stored_ids), dtype=bool)
+
+                ids = chunk[self.key_column].to_numpy(dtype="int64")
+                row_fingerprints = fingerprints(chunk, self.value_columns)
+                if len(stored_ids):
+                    positions = np.searchsorted(stored_ids, ids)
+                    positions = np.minimum(positions, len(stored_ids) - 1)
+                    is_carryover = stored_ids[positions] == ids
+                else:
+                    positions = np.zeros(len(ids), dtype="int64")
+                    is_carryover = np.zeros(len(ids), dtype=bool)
+                seen[positions[is_carryover]] = True
+                is_modified = is_carryover.copy()
+                is_modified[is_carryover] = (
+                    stored_fingerprints[positions[is_carryover]]
+                    != row_fingerprints[is_carryover]
+                )
+                counts["new"] += int((~is_carryover).sum())
+                counts["carryover"] += int(is_carryover.sum())
+                counts["modified"] += int(is_modified.sum())
+
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO new_ids (id) VALUES (?)",
+                    ((value,) for value in ids[~is_carryover].tolist()),
+                )
+                is_written = ~is_carryover | is_modified
+                self._upsert(chunk[is_written], row_fingerprints[is_written])
+
+            if stored_ids is not None:
+                deleted_ids = stored_ids[~seen]
+                counts["deleted"] = len(deleted_ids)
+                self.connection.executemany(
+                    f"DELETE FROM customers WHERE {key} = ?",
+                    ((value,) for value in deleted_ids.tolist()),
+                )
+        return counts["new"], counts["carryover"], counts["modified"], counts["deleted"]
+
+    def iter_new_records(self, order_by, chunk_size):
+        """The customers the last `sync_chunks` added, ordered by `order_by`, in chunks.
+
+        Rows with no `order_by` value come last; ties keep the daily file's order.
+        """
+        columns = ", ".join(f"customers.{quote(column)}" for column in self.columns)
+        order = f"customers.{quote(order_by)}"
+        return pd.read_sql_query(
+            f"SELECT {columns} FROM new_ids JOIN customers "
+            f"ON customers.{quote(self.key_column)} = new_ids.id "
+            f"ORDER BY {order} IS NULL, {order}, new_ids.position",
+            self.connection,
+            chunksize=chunk_size,
+        )
+
+    def column_dtypes(self):
+        """The `output_dtypes` of the stored rows as `pd.read_csv` would read them.
+
+        A column holding only integers is "Int64"; a numeric column with a real number or
+        a missing value is "float64", as pandas reads it. Text columns are left out.
+        """
+        if not self.columns:
+            return {}
+        kinds = ("integer", "real", "null", "text")
+        counts = self.connection.execute(
+            "SELECT "
+            + ", ".join(
+                f"SUM(typeof({quote(column)}) = '{kind}')"
+                for column in self.columns
+                for kind in kinds
+            )
+            + " FROM customers"
+        ).fetchone()
+        dtypes = {}
+        for position, column in enumerate(self.columns):
+            integer, real, null, text = (
+                count or 0 for count in counts[position * 4 : position * 4 + 4]
+            )
+            if text or not (integer or real):
+                continue
+            dtypes[column] = "float64" if real or null else "Int64"
+        return dtypes
+
+    def to_frame(self):
+        if not self.columns:
+            return pd.DataFrame()
+        columns = ", ".join(quote(column) for column in self.columns)
+        return pd.read_sql_query(f"SELECT {columns} FROM customers", self.connection)
+
+    def export_csv(self, csv_path):
+        self.to_frame().to_csv(csv_path, index=False)
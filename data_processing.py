@@ -1,15 +1,38 @@
 import csv
+from array import array
 from collections import Counter
 from datetime import datetime
-from config import COLUMN_SEVERITY_RISK, COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_DUE_DATE, PRIORITY_LEVELS
+from itertools import islice
+from config import COLUMN_SEVERITY_RISK, COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME, COLUMN_TITLE, COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_DUE_DATE, DUE_DATE_FORMAT, PRIORITY_LEVELS, CSV_CACHE_ENABLED
+from csv_cache import read_cached_columns, rows_from_columns
+from deliverables import DeliverableStore
+from topn import top_n as top_items
+from due_dates import DueDateHistogram, today_day
 
-def read_csv_data(file_path):
+def read_csv_data(file_path, chunk_size=None):
+    # With a chunk size the rows are streamed as lists of at most chunk_size rows
+    if chunk_size:
+        return iter_csv_chunks(file_path, chunk_size)
+    if CSV_CACHE_ENABLED:
+        cached = read_cached_columns(file_path)
+        if cached is not None:
+            fieldnames, columns, _ = cached
+            return rows_from_columns(fieldnames, columns)
     with open(file_path, 'r') as f:
         reader = csv.DictReader(f)
         return list(reader)
 
+def iter_csv_chunks(file_path, chunk_size):
+    with open(file_path, 'r') as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
 def parse_date(date_string):
-    return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
+    return datetime.strptime(date_string, DUE_DATE_FORMAT)
 
 def get_priority_data(data, priority):
     return [row for row in data if row[COLUMN_SEVERITY_RISK] == priority]
@@ -28,54 +51,182 @@ def get_top_vulnerable_hosts(data, priority, top_n):
     return host_counter.most_common(top_n)
 
 def get_due_date_outlook(data, priority, time_frames):
-    priority_data = get_priority_data(data, priority)
-    today = datetime.now().date()
-    due_dates = [parse_date(row[COLUMN_DUE_DATE]).date() for row in priority_data]
-    
-    past_due = sum(1 for date in due_dates if date < today)
-    due_today = sum(1 for date in due_dates if date == today)
-    
-    due_within_periods = {days: sum(1 for date in due_dates if 0 <= (date - today).days <= days) for days in time_frames}
-    
-    total_vulnerabilities = len(priority_data)
-    result = {
-        'past_due': (past_due, past_due/total_vulnerabilities if total_vulnerabilities else 0),
-        'due_today': (due_today, due_today/total_vulnerabilities if total_vulnerabilities else 0)
+    due_dates = DueDateHistogram()
+    for row in get_priority_data(data, priority):
+        due_dates.add(row[COLUMN_DUE_DATE])
+    return due_dates.outlook(time_frames)
+
+class GroupIndex:
+    """Rows grouped by one key: first-seen name, total, per-priority counts and row offsets.
+
+    `key` is a column name or a function of the row returning the key (None skips the row).
+    Groups keep first-seen order, so `most_common` breaks ties like `Counter.most_common`.
+    """
+
+    def __init__(self, key, name_column=None, track_offsets=True):
+        self.key = key
+        self.name_column = name_column
+        self.track_offsets = track_offsets
+        self.groups = {}
+
+    def add(self, offset, row):
+        key = self.key(row) if callable(self.key) else row[self.key]
+        if key is None:
+            return
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {
+                'name': row[self.name_column] if self.name_column else key,
+                'total': 0,
+                'priorities': Counter(),
+                'offsets': array('I') if self.track_offsets else None
+            }
+        group['total'] += 1
+        group['priorities'][row[COLUMN_SEVERITY_RISK]] += 1
+        if self.track_offsets:
+            group['offsets'].append(offset)
+
+    def remove(self, row):
+        # Offsets cannot be kept consistent once rows are taken out
+        if self.track_offsets:
+            raise ValueError("rows cannot be removed from a GroupIndex that tracks offsets")
+        key = self.key(row) if callable(self.key) else row[self.key]
+        if key is None:
+            return
+        group = self.groups[key]
+        group['total'] -= 1
+        group['priorities'][row[COLUMN_SEVERITY_RISK]] -= 1
+        if group['priorities'][row[COLUMN_SEVERITY_RISK]] <= 0:
+            del group['priorities'][row[COLUMN_SEVERITY_RISK]]
+        if group['total'] <= 0:
+            del self.groups[key]
+
+    def merge(self, other):
+        """Fold in an index built over the rows that follow this one's."""
+        # Offsets from another index are relative to its own rows
+        if self.track_offsets:
+            raise ValueError("a GroupIndex that tracks offsets cannot be merged")
+        for key, other_group in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {'name': other_group['name'], 'total': 0, 'priorities': Counter(), 'offsets': None}
+            group['total'] += other_group['total']
+            group['priorities'].update(other_group['priorities'])
+
+    def __contains__(self, key):
+        return key in self.groups
+
+    def __getitem__(self, key):
+        return self.groups[key]
+
+    def __len__(self):
+        return len(self.groups)
+
+    def most_common(self, top_n=None):
+        return top_items(self.groups, top_n, key=lambda item: item[1]['total'])
+
+    def rows(self, key, data):
+        return [data[offset] for offset in self.groups[key]['offsets']]
+
+def host_key(row):
+    return None if is_non_server_vuln(row) else get_host_or_source(row)
+
+def build_group_indexes(data):
+    indexes = {
+        'app': GroupIndex(COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME),
+        'host': GroupIndex(host_key),
+        'title': GroupIndex(COLUMN_TITLE)
     }
-    result.update({days: (count, count/total_vulnerabilities if total_vulnerabilities else 0) 
-                   for days, count in due_within_periods.items()})
-    
-    return result
+    for offset, row in enumerate(data):
+        for index in indexes.values():
+            index.add(offset, row)
+    return indexes
 
 def process_rd_csv(file_path):
-    with open(file_path, 'r') as f:
-        reader = csv.DictReader(f)
-        data = list(reader)
-    
-    # Group data by Application
-    grouped_data = {}
-    owner_summary = {}
-    
-    for row in data:
-        app = row['App']
-        owner = row['AssignedToFullName']
-        condition = row['Deliverable Condition']
-        
-        if app not in grouped_data:
-            grouped_data[app] = {
-                'AppID': row['AppID'],
-                'Deliverables': []
+    return group_deliverables(read_csv_data(file_path))
+
+def group_deliverables(data):
+    deliverables = DeliverableStore.from_rows(data)
+    return deliverables, deliverables.owner_summary
+
+def is_past_due_condition(condition):
+    return 'Past Due' in condition
+
+class ApplicationJoin:
+    """Vulnerabilities and deliverables linked by application ID with a single hash join.
+
+    The deliverables are hashed by AppID, then each application in the vulnerability
+    aggregate probes that table once. Applications present on only one side are kept with
+    zero counts for the other. Entries are plain dicts of the combined per-app metrics.
+    """
+
+    def __init__(self, aggregate, deliverables, today=None):
+        today = today_day() if today is None else today
+        past_due_codes = [is_past_due_condition(condition) for condition in deliverables.conditions.values]
+        owners = deliverables.owners.values
+
+        # Build side: deliverable metrics per AppID; several App names may share an ID
+        built = {}
+        for app, (app_id, owner_codes, condition_codes) in deliverables.apps.items():
+            side = built.get(app_id)
+            if side is None:
+                side = built[app_id] = {'name': app, 'deliverables': 0, 'past_due_deliverables': 0, 'owners': {}}
+            side['deliverables'] += len(condition_codes)
+            side['past_due_deliverables'] += sum(past_due_codes[code] for code in condition_codes)
+            side['owners'].update(dict.fromkeys(owner_codes))
+
+        # Probe side: every application with vulnerabilities, in the aggregate's order
+        self.apps = {}
+        for app_id, group in aggregate.apps.groups.items():
+            side = built.pop(app_id, None)
+            self.apps[app_id] = {
+                'app_id': app_id,
+                'name': group['name'],
+                'vulnerabilities': group['total'],
+                'priority_1': group['priorities'][PRIORITY_LEVELS[0]],
+                'past_due_vulnerabilities': aggregate.app_past_due(app_id, today),
+                'deliverables': side['deliverables'] if side else 0,
+                'past_due_deliverables': side['past_due_deliverables'] if side else 0,
+                'owners': [owners[code] for code in side['owners']] if side else []
             }
-        grouped_data[app]['Deliverables'].append({
-            'Owner': owner,
-            'Condition': condition
-        })
-        
-        # Update owner summary
-        if owner not in owner_summary:
-            owner_summary[owner] = {}
-        if condition not in owner_summary[owner]:
-            owner_summary[owner][condition] = 0
-        owner_summary[owner][condition] += 1
-    
-    return grouped_data, owner_summary
+        for app_id, side in built.items():
+            self.apps[app_id] = {
+                'app_id': app_id,
+                'name': side['name'],
+                'vulnerabilities': 0,
+                'priority_1': 0,
+                'past_due_vulnerabilities': 0,
+                'deliverables': side['deliverables'],
+                'past_due_deliverables': side['past_due_deliverables'],
+                'owners': [owners[code] for code in side['owners']]
+            }
+
+        self.apps_by_owner = {}
+        for app_id, entry in self.apps.items():
+            for owner in entry['owners']:
+                self.apps_by_owner.setdefault(owner, []).append(app_id)
+
+    def __contains__(self, app_id):
+        return app_id in self.apps
+
+    def __getitem__(self, app_id):
+        return self.apps[app_id]
+
+    def __iter__(self):
+        return iter(self.apps.values())
+
+    def __len__(self):
+        return len(self.apps)
+
+    def ranked(self, top_n=None):
+        """Entries by P1 count, then past-due vulnerabilities, then past-due deliverables."""
+        ranked = sorted(self.apps.values(), reverse=True, key=lambda entry: (
+            entry['priority_1'], entry['past_due_vulnerabilities'], entry['past_due_deliverables']))
+        return ranked if top_n is None else ranked[:top_n]
+
+    def for_owner(self, owner):
+        return [self.apps[app_id] for app_id in self.apps_by_owner.get(owner, [])]
+
+    def where(self, predicate):
+        """Drill-down, e.g. `join.where(lambda app: app['priority_1'] and not app['deliverables'])`."""
+        return [entry for entry in self.apps.values() if predicate(entry)]
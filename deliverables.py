@@ -0,0 +1,141 @@
+from array import array
+from collections.abc import Mapping
+
+def condition_class(condition):
+    if 'Past Due' in condition:
+        return 'priority-high'
+    elif 'Due 0 to 10 Days' in condition:
+        return 'priority-medium'
+    return ''
+
+class CodeTable:
+    """Distinct strings numbered in first-seen order; each string is stored once."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def index(self, value):
+        return self._codes[value]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+class OwnerConditionTable(Mapping):
+    """Deliverable counts as a dense owners x conditions table of uint32.
+
+    Reads like the old `owner_summary[owner][condition]` dict: each owner maps to its
+    non-zero counts, with conditions in the order they first appear in the file.
+    """
+
+    def __init__(self, owners, conditions, counts):
+        self.owners = owners
+        self.conditions = conditions
+        self.counts = counts
+
+    def count(self, owner, condition):
+        width = len(self.conditions)
+        return self.counts[self.owners.index(owner) * width + self.conditions.index(condition)]
+
+    def iter_counts(self):
+        """(owner code, condition code, count) for every non-zero cell, owner by owner."""
+        width = len(self.conditions)
+        counts = self.counts
+        for owner_code in range(len(self.owners)):
+            row = owner_code * width
+            for condition_code in range(width):
+                count = counts[row + condition_code]
+                if count:
+                    yield owner_code, condition_code, count
+
+    def __getitem__(self, owner):
+        width = len(self.conditions)
+        row = self.owners.index(owner) * width
+        return {self.conditions[code]: self.counts[row + code] for code in range(width) if self.counts[row + code]}
+
+    def __iter__(self):
+        return iter(self.owners.values)
+
+    def __len__(self):
+        return len(self.owners)
+
+class DeliverableStore(Mapping):
+    """Application deliverables with owners and conditions dictionary-encoded.
+
+    Each application keeps its ID and two parallel uint32 arrays of owner and condition
+    codes, and the CSS class of every distinct condition is worked out once. Indexing by
+    application still gives the old `{'AppID': ..., 'Deliverables': [...]}` shape for code
+    that expects it; the report iterates the codes directly.
+    """
+
+    def __init__(self):
+        self.owners = CodeTable()
+        self.conditions = CodeTable()
+        self.apps = {}
+        self.rows = 0
+        self.condition_classes = []
+        self.owner_summary = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        store = cls()
+        for row in rows:
+            store.add(row)
+        return store.finish()
+
+    def add(self, row):
+        app = self.apps.get(row['App'])
+        if app is None:
+            app = self.apps[row['App']] = (row['AppID'], array('I'), array('I'))
+        app[1].append(self.owners.code(row['AssignedToFullName']))
+        app[2].append(self.conditions.code(row['Deliverable Condition']))
+        self.rows += 1
+
+    def finish(self):
+        """Count every (owner, condition) pair into the dense table and classify each condition once."""
+        width = len(self.conditions)
+        counts = array('I', bytes(4 * len(self.owners) * width))
+        for _, owner_codes, condition_codes in self.apps.values():
+            for owner_code, condition_code in zip(owner_codes, condition_codes):
+                counts[owner_code * width + condition_code] += 1
+        self.owner_summary = OwnerConditionTable(self.owners, self.conditions, counts)
+        self.condition_classes = [condition_class(condition) for condition in self.conditions.values]
+        return self
+
+    def iter_app(self, app):
+        """(owner code, condition code) for each deliverable of one application, in file order."""
+        _, owner_codes, condition_codes = self.apps[app]
+        return zip(owner_codes, condition_codes)
+
+    def app_id(self, app):
+        return self.apps[app][0]
+
+    def __getitem__(self, app):
+        owners = self.owners.values
+        conditions = self.conditions.values
+        return {
+            'AppID': self.app_id(app),
+            'Deliverables': [{'Owner': owners[owner_code], 'Condition': conditions[condition_code]}
+                             for owner_code, condition_code in self.iter_app(app)]
+        }
+
+    def __iter__(self):
+        return iter(self.apps)
+
+    def __len__(self):
+        return len(self.apps)
+
+    def nbytes(self):
+        arrays = sum(owner_codes.itemsize * (len(owner_codes) + len(condition_codes))
+                     for _, owner_codes, condition_codes in self.apps.values())
+        return arrays + self.owner_summary.counts.itemsize * len(self.owner_summary.counts)
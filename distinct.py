@@ -0,0 +1,102 @@
+import math
+from functools import lru_cache
+from hashlib import blake2b
+
+@lru_cache(maxsize=2**16)
+def hash64(key):
+    """Stable 64-bit hash of a string or tuple of strings; the same in every process and on every day."""
+    if isinstance(key, tuple):
+        key = '\x1f'.join(key)
+    return int.from_bytes(blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class DistinctCounter:
+    """Counts distinct keys exactly up to `threshold`, then with a HyperLogLog sketch.
+
+    Below the threshold the 64-bit hashes of the keys are kept in a set, so small counts
+    are exact. Past it they are folded into 2**precision one-byte registers and the count
+    is an estimate with a relative standard error of about 1.04 / sqrt(2**precision)
+    (0.8% at the default precision of 14, using 16 KiB). Counters merge with `update`, so
+    shard or daily counters combine into the distinct count of their union. Keys cannot be
+    removed again.
+    """
+
+    def __init__(self, threshold, precision=14):
+        self.threshold = threshold
+        self.precision = precision
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, key):
+        if self.registers is None:
+            self.hashes.add(hash64(key))
+            if len(self.hashes) > self.threshold:
+                self._to_sketch()
+        else:
+            self._add_hash(hash64(key))
+
+    def _add_hash(self, value):
+        precision = self.precision
+        index = value >> (64 - precision)
+        rest = value & ((1 << (64 - precision)) - 1)
+        rank = (64 - precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _to_sketch(self):
+        self.registers = bytearray(1 << self.precision)
+        for value in self.hashes:
+            self._add_hash(value)
+        self.hashes = None
+
+    @property
+    def exact(self):
+        return self.registers is None
+
+    def update(self, other):
+        """Fold in another counter built with the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("only counters with the same precision can be merged")
+        if self.registers is None and other.registers is None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > self.threshold:
+                self._to_sketch()
+            return self
+        if self.registers is None:
+            self._to_sketch()
+        if other.registers is None:
+            for value in other.hashes:
+                self._add_hash(value)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        if self.registers is None:
+            return len(self.hashes)
+        registers = self.registers
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in registers)
+        zeros = registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            return m * math.log(m / zeros)
+        return raw
+
+    def __len__(self):
+        return round(self.estimate())
+
+    def to_state(self):
+        if self.registers is None:
+            return {'threshold': self.threshold, 'precision': self.precision, 'hashes': sorted(self.hashes)}
+        return {'threshold': self.threshold, 'precision': self.precision, 'registers': self.registers.hex()}
+
+    @classmethod
+    def from_state(cls, state):
+        counter = cls(state['threshold'], state['precision'])
+        if 'registers' in state:
+            counter.hashes = None
+            counter.registers = bytearray.fromhex(state['registers'])
+        else:
+            counter.hashes = set(state['hashes'])
+        return counter
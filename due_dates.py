@@ -0,0 +1,76 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from itertools import accumulate
+from config import DUE_DATE_FORMAT
+
+@lru_cache(maxsize=2**16)
+def parse_due_day(date_string):
+    """Day number (`date.toordinal()`) of a due date string; each distinct string is parsed once."""
+    return datetime.strptime(date_string, DUE_DATE_FORMAT).toordinal()
+
+def today_day():
+    return datetime.now().date().toordinal()
+
+class DueDateHistogram:
+    """Vulnerability counts per due day, answering every outlook window with binary searches."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+        self._sorted = None
+
+    def add_day(self, day, count=1):
+        self.counts[day] += count
+        self.total += count
+        self._sorted = None
+
+    def add(self, date_string):
+        self.add_day(parse_due_day(date_string))
+
+    def remove_day(self, day, count=1):
+        self.counts[day] -= count
+        if self.counts[day] <= 0:
+            del self.counts[day]
+        self.total -= count
+        self._sorted = None
+
+    def remove(self, date_string):
+        self.remove_day(parse_due_day(date_string))
+
+    def update(self, other):
+        for day, count in other.counts.items():
+            self.add_day(day, count)
+
+    def _cumulative(self):
+        # One sort per histogram state; every window below is then two bisects on it
+        if self._sorted is None:
+            days = sorted(self.counts)
+            self._sorted = (days, [0, *accumulate(self.counts[day] for day in days)])
+        return self._sorted
+
+    def count_between(self, first_day, last_day):
+        """Number of vulnerabilities due on a day in [first_day, last_day]."""
+        days, cumulative = self._cumulative()
+        return cumulative[bisect_right(days, last_day)] - cumulative[bisect_left(days, first_day)]
+
+    def count_before(self, day):
+        days, cumulative = self._cumulative()
+        return cumulative[bisect_left(days, day)]
+
+    def outlook(self, time_frames, today=None):
+        """Past-due, due-today and due-within-N-days counts with their share of the total."""
+        today = today_day() if today is None else today
+        total = self.total
+
+        def with_share(count):
+            return (count, count/total if total else 0)
+
+        result = {
+            'past_due': with_share(self.count_before(today)),
+            'due_today': with_share(self.count_between(today, today))
+        }
+        result.update({days: with_share(self.count_between(today, today + days)) for days in time_frames})
+
+        return result
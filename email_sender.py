@@ -1,21 +1,297 @@
-import win32com.client
+import argparse
+import json
+import mailbox
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from config import *
 
-def send_outlook_email(subject, body, recipients):
-    try:
-        outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
-        message = outlook.Application.CreateItem(0)
+class OutlookTransport:
+    """Sends through the local Outlook client, reusing one MAPI session for every message."""
+
+    def __init__(self):
+        self.outlook = None
+        self.com_initialized = False
+
+    def open(self):
+        # Imported here so the other transports work on machines without pywin32
+        import pythoncom
+        import win32com.client
+        # Each thread that talks to COM has to initialise it first, and undo that in close()
+        # even if Outlook could not be reached
+        pythoncom.CoInitialize()
+        self.com_initialized = True
+        self.outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
+
+    def send(self, subject, body, recipients):
+        message = self.outlook.Application.CreateItem(0)
         message.Subject = subject
         message.HTMLBody = body
-        
-        if isinstance(recipients, str):
-            recipients = [recipients]
-        
         for recipient in recipients:
             message.Recipients.Add(recipient)
-        
         message.Send()
-        print(f"Email sent successfully to: {', '.join(recipients)}")
-        return True
+
+    def close(self):
+        self.outlook = None
+        if self.com_initialized:
+            self.com_initialized = False
+            import pythoncom
+            pythoncom.CoUninitialize()
+
+class SmtpTransport:
+    """Sends over one SMTP connection, reconnecting once if the server dropped it."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_tls=SMTP_USE_TLS,
+                 username=SMTP_USERNAME, password=SMTP_PASSWORD, sender=EMAIL_SENDER, timeout=SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.connection = None
+
+    def open(self):
+        self.connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            self.connection.starttls()
+        if self.username:
+            self.connection.login(self.username, self.password)
+
+    def send(self, subject, body, recipients):
+        message = build_message(subject, body, recipients, self.sender)
+        try:
+            self.connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.open()
+            self.connection.send_message(message)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except smtplib.SMTPException:
+                pass
+            self.connection = None
+
+class MaildirTransport:
+    """Delivers into a local Maildir instead of sending, for test runs and dry runs."""
+
+    def __init__(self, path=MAILDIR_PATH, sender=EMAIL_SENDER):
+        self.path = path
+        self.sender = sender
+        self.maildir = None
+
+    def open(self):
+        self.maildir = mailbox.Maildir(self.path, create=True)
+
+    def send(self, subject, body, recipients):
+        self.maildir.add(build_message(subject, body, recipients, self.sender))
+
+    def close(self):
+        self.maildir = None
+
+TRANSPORTS = {
+    'outlook': OutlookTransport,
+    'smtp': SmtpTransport,
+    'maildir': MaildirTransport
+}
+
+def get_transport(name=MAIL_TRANSPORT):
+    """A new, unopened transport of the configured kind."""
+    try:
+        return TRANSPORTS[name]()
+    except KeyError:
+        raise ValueError(f"unknown mail transport {name!r}; expected one of {', '.join(TRANSPORTS)}") from None
+
+def build_message(subject, body, recipients, sender):
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = sender
+    message['To'] = ', '.join(recipients)
+    message.set_content(body, subtype='html')
+    return message
+
+def as_list(recipients):
+    return [recipients] if isinstance(recipients, str) else list(recipients)
+
+class RetrySpool:
+    """Failed messages kept on disk, one JSON file each, until a retry sends them.
+
+    A message is retried after MAIL_RETRY_DELAY_SECONDS, doubling with every failed attempt;
+    after MAIL_MAX_ATTEMPTS it is moved to the `dead` subdirectory for a person to look at.
+    """
+
+    def __init__(self, directory=MAIL_SPOOL_DIR, max_attempts=MAIL_MAX_ATTEMPTS, retry_delay=MAIL_RETRY_DELAY_SECONDS):
+        self.directory = directory
+        self.dead_directory = os.path.join(directory, 'dead')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+
+    def _write(self, directory, entry):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{entry['id']}.json")
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(path + '.tmp', path)
+
+    def add(self, subject, body, recipients, error, attempts=1, message_id=None):
+        entry = {
+            'id': message_id or uuid.uuid4().hex,
+            'subject': subject,
+            'body': body,
+            'recipients': as_list(recipients),
+            'attempts': attempts,
+            'last_error': str(error),
+            'next_attempt': time.time() + self.retry_delay * 2 ** (attempts - 1)
+        }
+        with self.lock:
+            if attempts >= self.max_attempts:
+                self._write(self.dead_directory, entry)
+                self._remove(entry['id'])
+            else:
+                self._write(self.directory, entry)
+        return entry['id']
+
+    def _remove(self, message_id):
+        path = os.path.join(self.directory, f'{message_id}.json')
+        if os.path.exists(path):
+            os.remove(path)
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    entries.append(json.load(f))
+        return entries
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return [entry for entry in self.entries() if entry['next_attempt'] <= now]
+
+    def retry(self, transport_name=MAIL_TRANSPORT, workers=MAIL_WORKERS, now=None):
+        """Resend every due message; returns the number sent."""
+        due = self.due(now)
+        if not due:
+            return 0
+        with MailQueue(transport_name, workers, spool=self) as mail_queue:
+            for entry in due:
+                mail_queue.submit(entry['subject'], entry['body'], entry['recipients'],
+                                  attempts=entry['attempts'], message_id=entry['id'])
+        return mail_queue.sent
+
+class MailQueue:
+    """A bounded queue of messages sent by worker threads, each holding its own open transport.
+
+    `submit` blocks while `max_pending` messages are waiting, so a fan-out never holds more
+    than that many report bodies in memory. Failed sends go to the retry spool if one is set.
+    """
+
+    def __init__(self, transport_name=MAIL_TRANSPORT, workers=MAIL_WORKERS, spool=None, max_pending=None):
+        self.transport_name = transport_name
+        self.spool = spool
+        self.pending = queue.Queue(maxsize=max_pending or workers * 2)
+        self.sent = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, subject, body, recipients, attempts=0, message_id=None):
+        self.pending.put((subject, body, as_list(recipients), attempts, message_id))
+
+    def _work(self):
+        transport = None
+        try:
+            while True:
+                item = self.pending.get()
+                if item is None:
+                    return
+                subject, body, recipients, attempts, message_id = item
+                try:
+                    if transport is None:
+                        transport = get_transport(self.transport_name)
+                        transport.open()
+                    transport.send(subject, body, recipients)
+                except Exception as e:
+                    self._failed(item, e)
+                    # Start a fresh session for the next message
+                    if transport is not None:
+                        close_quietly(transport)
+                        transport = None
+                else:
+                    with self.lock:
+                        self.sent += 1
+                    if self.spool is not None and message_id is not None:
+                        with self.spool.lock:
+                            self.spool._remove(message_id)
+        finally:
+            if transport is not None:
+                close_quietly(transport)
+
+    def _failed(self, item, error):
+        subject, body, recipients, attempts, message_id = item
+        with self.lock:
+            self.failed += 1
+        print(f"An error occurred while sending the email to {', '.join(recipients)}: {error}")
+        if self.spool is not None:
+            self.spool.add(subject, body, recipients, error, attempts + 1, message_id)
+
+    def close(self):
+        """Wait for every submitted message to be sent or spooled."""
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def close_quietly(transport):
+    try:
+        transport.close()
+    except Exception:
+        pass
+
+def send_email(subject, body, recipients, transport_name=MAIL_TRANSPORT, spool=None):
+    """Send one message now; on failure it is spooled for a later retry. Returns True if sent."""
+    recipients = as_list(recipients)
+    transport = get_transport(transport_name)
+    try:
+        transport.open()
+        transport.send(subject, body, recipients)
     except Exception as e:
         print(f"An error occurred while sending the email: {str(e)}")
+        if spool is not None:
+            spool.add(subject, body, recipients, e)
         return False
+    finally:
+        close_quietly(transport)
+    print(f"Email sent successfully to: {', '.join(recipients)}")
+    return True
+
+def send_outlook_email(subject, body, recipients):
+    return send_email(subject, body, recipients, transport_name='outlook')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resend the messages waiting in the retry spool.')
+    parser.add_argument('--spool-dir', default=MAIL_SPOOL_DIR)
+    parser.add_argument('--transport', choices=list(TRANSPORTS), default=MAIL_TRANSPORT)
+    parser.add_argument('--all', action='store_true', help='retry every spooled message, not only those due')
+    args = parser.parse_args()
+    spool = RetrySpool(args.spool_dir)
+    sent = spool.retry(args.transport, now=float('inf') if args.all else None)
+    print(f"Resent {sent} messages; {len(spool.entries())} still waiting in {args.spool_dir}")
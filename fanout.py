@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from config import *
+from aggregation import VulnerabilityAggregate
+from data_processing import read_csv_data, group_deliverables
+from report_generation import write_html_report
+from email_sender import MailQueue, RetrySpool
+from instrumentation import stage
+
+PARTITIONS = {'application': 'AppID', 'owner': 'AssignedToFullName'}
+MANIFEST_NAME = 'manifest.json'
+
+def aggregate_by_application(file_path):
+    """One aggregate per application ID from a single streamed pass, in first-seen order."""
+    aggregates = {}
+    for chunk in read_csv_data(file_path, CSV_CHUNK_SIZE):
+        for row in chunk:
+            app_id = row[COLUMN_APPLICATION_ID]
+            aggregate = aggregates.get(app_id)
+            if aggregate is None:
+                aggregate = aggregates[app_id] = VulnerabilityAggregate()
+            aggregate.add(row)
+    return aggregates
+
+def group_rows(rows, column):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[column], []).append(row)
+    return groups
+
+def build_partitions(app_aggregates, deliverable_rows, partition):
+    """Yield (key, aggregate, deliverable rows) for every application or owner.
+
+    Per-application aggregates are computed once and shared: an application partition uses
+    its aggregate directly, an owner partition merges the aggregates of the owner's apps.
+    Apps are merged in the order they first appear in the vulnerability file, so ties in
+    the owner's report are broken by that order rather than by row position.
+    """
+    if partition == 'application':
+        by_app = group_rows(deliverable_rows, PARTITIONS['application'])
+        for app_id in {**app_aggregates, **by_app}:
+            yield app_id, app_aggregates.get(app_id) or VulnerabilityAggregate(), by_app.get(app_id, [])
+    elif partition == 'owner':
+        file_order = {app_id: position for position, app_id in enumerate(app_aggregates)}
+        for owner, rows in group_rows(deliverable_rows, PARTITIONS['owner']).items():
+            app_ids = {row[PARTITIONS['application']] for row in rows if row[PARTITIONS['application']] in file_order}
+            aggregate = VulnerabilityAggregate()
+            for app_id in sorted(app_ids, key=file_order.get):
+                aggregate.merge(app_aggregates[app_id])
+            yield owner, aggregate, rows
+    else:
+        raise ValueError(f"unknown partition {partition!r}; expected one of {', '.join(PARTITIONS)}")
+
+def report_file_name(key, used):
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', key).strip('._') or 'unassigned'
+    candidate, suffix = name, 1
+    while candidate.lower() in used:
+        suffix += 1
+        candidate = f'{name}_{suffix}'
+    used.add(candidate.lower())
+    return f'{candidate}.html'
+
+def render_partition(path, aggregate, deliverable_rows):
+    rd_data, owner_summary = group_deliverables(deliverable_rows)
+    with open(path, 'w', encoding='utf-8') as f:
+        write_html_report(f, aggregate, rd_data, owner_summary)
+    return {
+        'vulnerabilities': aggregate.total,
+        'past_due': aggregate.past_due(),
+        'deliverables': len(deliverable_rows)
+    }
+
+def fan_out(csv_path, rd_csv_path, output_dir, partition='application', workers=1):
+    """Write one report per partition into `output_dir` along with a manifest; returns the manifest.
+
+    Both CSVs are read once. With more than one worker the reports are rendered on a process pool.
+    """
+    with stage('read_vulnerabilities') as record:
+        app_aggregates = aggregate_by_application(csv_path)
+        record.rows = sum(aggregate.total for aggregate in app_aggregates.values())
+    with stage('read_deliverables') as record:
+        deliverable_rows = read_csv_data(rd_csv_path)
+        record.rows = len(deliverable_rows)
+
+    os.makedirs(output_dir, exist_ok=True)
+    used_names = set()
+    keys, jobs = [], []
+    for key, aggregate, rows in build_partitions(app_aggregates, deliverable_rows, partition):
+        keys.append(key)
+        jobs.append((os.path.join(output_dir, report_file_name(key, used_names)), aggregate, rows))
+
+    with stage('render_reports') as record:
+        paths, aggregates, rows = zip(*jobs) if jobs else ((), (), ())
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                stats = list(executor.map(render_partition, paths, aggregates, rows, chunksize=4))
+        else:
+            stats = list(map(render_partition, paths, aggregates, rows))
+        record.rows = len(jobs)
+
+    manifest = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'partition': partition,
+        'vulnerabilities_csv': csv_path,
+        'deliverables_csv': rd_csv_path,
+        'reports': [{'key': key, 'file': os.path.basename(path), **report_stats}
+                    for key, path, report_stats in zip(keys, paths, stats)]
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def send_reports(manifest, output_dir, recipients_by_key=FANOUT_RECIPIENTS, transport_name=MAIL_TRANSPORT):
+    """Mail each report to its partition's recipients on the bounded send queue; returns (sent, failed)."""
+    with MailQueue(transport_name, MAIL_WORKERS, spool=RetrySpool()) as mail_queue:
+        for report in manifest['reports']:
+            recipients = recipients_by_key.get(report['key'])
+            if not recipients:
+                continue
+            with open(os.path.join(output_dir, report['file']), 'r', encoding='utf-8') as f:
+                body = f.read()
+            mail_queue.submit(f"{EMAIL_SUBJECT}: {report['key']}", body, recipients)
+    return mail_queue.sent, mail_queue.failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write one security report per application or owner.')
+    parser.add_argument('--partition', choices=list(PARTITIONS), default=FANOUT_PARTITION)
+    parser.add_argument('--output-dir', default=FANOUT_OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=FANOUT_WORKERS)
+    parser.add_argument('--csv', default=CSV_FILE_PATH)
+    parser.add_argument('--rd-csv', default=RD_CSV_FILE_PATH)
+    parser.add_argument('--send', action='store_true', help='mail each report to its FANOUT_RECIPIENTS entry')
+    args = parser.parse_args()
+    manifest = fan_out(args.csv, args.rd_csv, args.output_dir, args.partition, args.workers)
+    print(f"Wrote {len(manifest['reports'])} reports to {args.output_dir}")
+    if args.send:
+        sent, failed = send_reports(manifest, args.output_dir)
+        print(f"Sent {sent} reports; {failed} failed and were queued in '{MAIL_SPOOL_DIR}'")
@@ -0,0 +1,185 @@
+import base64
+import json
+import os
+from array import array
+from config import (
+    COLUMN_SEVERITY_RISK, COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME,
+    COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_TITLE, COLUMN_DUE_DATE, ROW_IDENTITY_COLUMNS, CSV_CHUNK_SIZE
+)
+from aggregation import STATE_VERSION, VulnerabilityAggregate
+from data_processing import read_csv_data
+from distinct import hash64
+
+# Columns the aggregate reads; a carryover row only needs re-counting when one of these changed
+AGGREGATE_COLUMNS = [
+    COLUMN_SEVERITY_RISK,
+    COLUMN_APPLICATION_ID,
+    COLUMN_APPLICATION_FULL_NAME,
+    COLUMN_HOST_NAME,
+    COLUMN_SOURCES,
+    COLUMN_TITLE,
+    COLUMN_DUE_DATE
+]
+
+# Bumped whenever `RowIndex.to_state` changes shape, so older saved states are rebuilt
+INDEX_VERSION = 2
+
+class RowDelta:
+    """How today's rows compare with the saved baseline (the io2.py classification)."""
+
+    def __init__(self):
+        self.new = 0
+        self.changed = 0
+        self.deleted = 0
+        self.carryover = 0
+
+    def __len__(self):
+        return self.new + self.changed + self.deleted
+
+    def as_dict(self):
+        return {'new': self.new, 'changed': self.changed, 'deleted': self.deleted, 'carryover': self.carryover}
+
+def encode_ints(values, typecode='Q'):
+    return base64.b64encode(array(typecode, values).tobytes()).decode('ascii')
+
+def decode_ints(text, typecode='Q'):
+    values = array(typecode)
+    values.frombytes(base64.b64decode(text))
+    return values
+
+class RowIndex:
+    """The rows an aggregate was built from, reduced to what a later refresh needs.
+
+    `counts` is a multiset of rows: it maps (64-bit hash of the key columns, 64-bit
+    fingerprint of the aggregate columns) to how many rows have both, so where a row sits
+    in the file does not matter. `rows` keeps the aggregate column values once per
+    fingerprint, in the order the fingerprints first appeared, so a changed or deleted row
+    can be taken out of the aggregate again. Rows are otherwise never stored.
+    """
+
+    def __init__(self, counts=None, rows=None):
+        self.counts = counts if counts is not None else {}
+        self.rows = rows if rows is not None else {}
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def row(self, fingerprint):
+        return dict(zip(AGGREGATE_COLUMNS, self.rows[fingerprint]))
+
+    def to_state(self):
+        # Values are dictionary-encoded per column; codes, hashes and counts are packed arrays
+        tables = [{} for _ in AGGREGATE_COLUMNS]
+        codes = array('I')
+        for values in self.rows.values():
+            for table, value in zip(tables, values):
+                codes.append(table.setdefault(value, len(table)))
+        return {
+            'version': INDEX_VERSION,
+            'keys': encode_ints(key for key, _ in self.counts),
+            'fingerprints': encode_ints(fingerprint for _, fingerprint in self.counts),
+            'counts': encode_ints(self.counts.values(), 'I'),
+            'row_fingerprints': encode_ints(self.rows.keys()),
+            'values': [list(table) for table in tables],
+            'codes': encode_ints(codes, 'I')
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        pairs = zip(decode_ints(state['keys']), decode_ints(state['fingerprints']))
+        counts = dict(zip(pairs, decode_ints(state['counts'], 'I')))
+        width = len(AGGREGATE_COLUMNS)
+        codes = decode_ints(state['codes'], 'I')
+        tables = state['values']
+        rows = {}
+        for position, fingerprint in enumerate(decode_ints(state['row_fingerprints'])):
+            row_codes = codes[position * width:(position + 1) * width]
+            rows[fingerprint] = tuple(table[code] for table, code in zip(tables, row_codes))
+        return cls(counts, rows)
+
+def save_state(state_path, aggregate, index):
+    temporary = state_path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({'aggregate': aggregate.to_state(), 'index': index.to_state()}, f)
+    os.replace(temporary, state_path)
+
+def load_state(state_path):
+    """(aggregate, index) from the state file, or None if it is missing, unreadable or from an older version."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state['aggregate'].get('version') != STATE_VERSION
+                or state['index'].get('version') != INDEX_VERSION):
+            return None
+        return VulnerabilityAggregate.from_state(state['aggregate']), RowIndex.from_state(state['index'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def refresh_aggregate(csv_path, state_path, key_columns=ROW_IDENTITY_COLUMNS, chunk_size=CSV_CHUNK_SIZE):
+    """Bring the persisted aggregate up to date with today's export; returns (aggregate, delta).
+
+    Today's export is streamed once into a row index, and its (key, fingerprint) counts are
+    diffed against the saved ones: only rows whose count went up are added to the
+    aggregate and only rows whose count went down are removed, however the rows moved
+    around in the file. Per key, an added row paired with a removed one is a change.
+    Without a usable saved state every row is new, which builds the aggregate from
+    scratch. The refreshed aggregate and index are saved for the next run.
+
+    The result, including the first-seen order that breaks ties in the report, is the
+    same as `VulnerabilityAggregate.from_rows` over today's export.
+    """
+    saved = load_state(state_path)
+    if saved is None:
+        # Exact counts: heavy-hitter summaries and distinct sketches cannot take rows out again
+        aggregate, previous = VulnerabilityAggregate(top_n_capacity=None, distinct_threshold=None), RowIndex()
+    else:
+        aggregate, previous = saved
+
+    index = RowIndex()
+    counts, rows = index.counts, index.rows
+    for chunk in read_csv_data(csv_path, chunk_size=chunk_size):
+        for row in chunk:
+            values = tuple(row[column] for column in AGGREGATE_COLUMNS)
+            fingerprint = hash64(values)
+            pair = (hash64(tuple(row[column] for column in key_columns)), fingerprint)
+            counts[pair] = counts.get(pair, 0) + 1
+            if fingerprint not in rows:
+                rows[fingerprint] = values
+
+    added = {}
+    removed = {}
+    for pair, count in counts.items():
+        difference = count - previous.counts.pop(pair, 0)
+        if difference > 0:
+            added.setdefault(pair[0], []).extend([pair[1]] * difference)
+        elif difference < 0:
+            removed.setdefault(pair[0], []).extend([pair[1]] * -difference)
+    # Whatever today's export no longer has at all has been deleted
+    for (key, fingerprint), count in previous.counts.items():
+        removed.setdefault(key, []).extend([fingerprint] * count)
+
+    # Adding before removing keeps every key that is still in today's export above zero,
+    # so it never loses its place in the aggregate's first-seen order
+    delta = RowDelta()
+    for key, fingerprints in added.items():
+        for fingerprint in fingerprints:
+            aggregate.add(index.row(fingerprint))
+        changed = min(len(fingerprints), len(removed.get(key, ())))
+        delta.changed += changed
+        delta.new += len(fingerprints) - changed
+    for key, fingerprints in removed.items():
+        for fingerprint in fingerprints:
+            aggregate.remove(previous.row(fingerprint))
+        delta.deleted += len(fingerprints) - min(len(fingerprints), len(added.get(key, ())))
+    delta.carryover = len(index) - delta.new
+
+    # Keys first seen in rows that came or went can move in the first-seen order; when the
+    # distinct rows appear in a different order than last time, it is rebuilt from them
+    order_changed = list(rows) != list(previous.rows)
+    if order_changed:
+        aggregate.reorder(index.row(fingerprint) for fingerprint in rows)
+
+    # An export with the same rows in the same order leaves the saved state as it is
+    if delta or order_changed:
+        save_state(state_path, aggregate, index)
+    return aggregate, delta
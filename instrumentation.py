@@ -0,0 +1,167 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_enabled = False
+_trace_memory = False
+_records = []
+_stack = threading.local()
+_origin = time.perf_counter()
+
+class StageRecord:
+    """Timings of one instrumented stage; set `rows` inside the `with` block to record a row count.
+
+    `details` can likewise be set to a dict of other counts worth keeping in the run log.
+
+    `peak_traced_bytes` is the tracemalloc peak above the traced total when the stage began.
+    """
+
+    __slots__ = ('name', 'depth', 'start', 'wall_seconds', 'cpu_seconds', 'max_rss_bytes',
+                 'peak_traced_bytes', 'rows', 'details', 'thread', '_start_traced', '_child_peak')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.start = time.perf_counter() - _origin
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.max_rss_bytes = None
+        self.peak_traced_bytes = None
+        self.rows = None
+        self.details = None
+        self.thread = threading.get_ident()
+        self._start_traced = 0
+        self._child_peak = 0
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if not slot.startswith('_')}
+
+class _NullRecord:
+    """Stands in for StageRecord when instrumentation is off; attribute writes are dropped."""
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_STAGE = nullcontext(_NullRecord())
+
+def configure(enabled, trace_memory=False):
+    """Switch instrumentation on or off for this process and start a fresh set of records."""
+    global _enabled, _trace_memory
+    _enabled = enabled
+    _trace_memory = enabled and trace_memory
+    _records.clear()
+    if _trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def records():
+    return [record.as_dict() for record in _records]
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+@contextmanager
+def _measured_stage(name):
+    parents = _stack.__dict__.setdefault('records', [])
+    record = StageRecord(name, len(parents))
+    parents.append(record)
+    if _trace_memory:
+        tracemalloc.reset_peak()
+        record._start_traced = tracemalloc.get_traced_memory()[0]
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall_seconds = time.perf_counter() - wall_started
+        record.cpu_seconds = time.process_time() - cpu_started
+        record.max_rss_bytes = _max_rss_bytes()
+        if _trace_memory:
+            # reset_peak is global, so a stage's peak also covers the peaks its children reported
+            peak = max(tracemalloc.get_traced_memory()[1], record._child_peak)
+            record.peak_traced_bytes = peak - record._start_traced
+            tracemalloc.reset_peak()
+        # Usually the last entry, but a generator stage that was abandoned part-way is only
+        # closed when it is collected, after stages opened later; so remove by identity
+        position = len(parents) - 1
+        while parents[position] is not record:
+            position -= 1
+        if _trace_memory and position > 0:
+            parents[position - 1]._child_peak = max(parents[position - 1]._child_peak, peak)
+        del parents[position]
+        _records.append(record)
+
+def stage(name):
+    """Context manager timing a block; a no-op costing one flag check when instrumentation is off."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _measured_stage(name)
+
+def instrumented(name=None):
+    """Decorator recording each call as a stage; generator functions are timed until exhausted."""
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        if inspect.isgeneratorfunction(function):
+            def run_generator(args, kwargs):
+                with _measured_stage(stage_name):
+                    yield from function(*args, **kwargs)
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return function(*args, **kwargs)
+                return run_generator(args, kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return function(*args, **kwargs)
+                with _measured_stage(stage_name):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def write_run_log(path):
+    run = {
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'pid': os.getpid(),
+        'trace_memory': _trace_memory,
+        'stages': sorted(records(), key=lambda record: record['start'])
+    }
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+
+def write_chrome_trace(path):
+    """Write the stages in Chrome trace event format (load it in chrome://tracing or Perfetto)."""
+    pid = os.getpid()
+    events = []
+    for record in _records:
+        args = {key: value for key, value in record.as_dict().items()
+                if key in ('cpu_seconds', 'max_rss_bytes', 'peak_traced_bytes', 'rows') and value is not None}
+        events.append({
+            'name': record.name,
+            'ph': 'X',
+            'ts': record.start * 1e6,
+            'dur': record.wall_seconds * 1e6,
+            'pid': pid,
+            'tid': record.thread,
+            'args': args
+        })
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
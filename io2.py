@@ -2,23 +2,27 @@ import pandas as pd
 import os
 from datetime import datetime
 
+from change_summary import append_summaries
+from country_output import (
+    write_new_customers_by_country,
+    write_new_customers_by_country_chunks,
+)
+from customer_store import CustomerStore
+
 # Paths to your files
 accumulated_file_path = "accumulated_customers.csv"
+accumulated_store_path = "accumulated_customers.sqlite"
 new_data_file_path = "todays_customers.csv"
 output_file_path = "sorted_new_customers_by_country.csv"
 seen_countries_file_path = "seen_countries.txt"
 summary_file_path = "summary_of_changes.csv"
 
-# Load the accumulated data
-try:
-    accumulated_data = pd.read_csv(accumulated_file_path)
-except FileNotFoundError:
-    accumulated_data = (
-        pd.DataFrame()
-    )  # If the file does not exist, create an empty DataFrame
+# Rows to read at a time; set it to process files that do not fit in memory
+chunk_size = None
 
-# Load the new data
-new_data = pd.read_csv(new_data_file_path)
+# Open the accumulated data; a previous run's CSV is imported into the store once
+accumulated_store = CustomerStore(accumulated_store_path)
+accumulated_store.import_csv(accumulated_file_path, chunk_size)
 
 # Load the set of seen countries
 if os.path.exists(seen_countries_file_path):
@@ -27,55 +31,42 @@ if os.path.exists(seen_countries_file_path):
 else:
     seen_countries = set()
 
-# Identify new records by comparing the new data with the accumulated data
-if not accumulated_data.empty:
-    new_records = new_data[
-        ~new_data["Customer Id"].isin(accumulated_data["Customer Id"])
-    ]
-    carryover_records = new_data[
-        new_data["Customer Id"].isin(accumulated_data["Customer Id"])
-    ]
-    deleted_records = accumulated_data[
-        ~accumulated_data["Customer Id"].isin(new_data["Customer Id"])
-    ]
+if chunk_size:
+    # Stream the new data through the store, then stream the new records back out
+    # sorted by country; only one chunk of rows is in memory at a time
+    new_count, carryover_count, modified_count, deleted_count = (
+        accumulated_store.sync_chunks(
+            pd.read_csv(new_data_file_path, chunksize=chunk_size)
+        )
+    )
+    write_new_customers_by_country_chunks(
+        accumulated_store.iter_new_records("Country", chunk_size),
+        seen_countries,
+        output_file_path,
+        accumulated_store.column_dtypes(),
+    )
 else:
-    new_records = new_data
-    carryover_records = pd.DataFrame()
-    deleted_records = pd.DataFrame()
-
-# Combine carryover records and new records to form the updated accumulated data
-updated_accumulated_data = pd.concat([carryover_records, new_records]).drop_duplicates()
-
-# Sort the new records by 'Country'
-sorted_new_records = new_records.sort_values(by="Country")
-
-# Prepare a new list to hold the transformed data
-output_data = []
-
-# Get the unique countries in the new data
-new_countries = sorted_new_records["Country"].unique()
-
-# Get the unique countries in the accumulated data
-existing_countries = (
-    carryover_records["Country"].unique() if not carryover_records.empty else []
-)
-
-# Iterate over each unique country and add the country name row if it is a new country
-for country in new_countries:
-    if country not in seen_countries:
-        output_data.append({"Country": f"Here are all the records for {country}"})
-        seen_countries.add(country)  # Update the set of seen countries
-    country_data = sorted_new_records[sorted_new_records["Country"] == country]
-    output_data.extend(country_data.to_dict(orient="records"))
-
-# Convert the output data back to a DataFrame
-output_df = pd.DataFrame(output_data)
-
-# Save the transformed data to a new CSV file
-output_df.to_csv(output_file_path, index=False)
-
-# Save the updated accumulated data
-updated_accumulated_data.to_csv(accumulated_file_path, index=False)
+    # Load the new data
+    new_data = pd.read_csv(new_data_file_path)
+
+    # Identify new, carryover, modified and deleted records and update the accumulated
+    # data in place: only new and modified rows are written and removed ones deleted
+    (
+        new_records,
+        carryover_records,
+        modified_records,
+        deleted_records,
+    ) = accumulated_store.sync(new_data)
+    new_count, carryover_count, modified_count, deleted_count = (
+        len(new_records),
+        len(carryover_records),
+        len(modified_records),
+        len(deleted_records),
+    )
+
+    # Write the new records sorted by country, with a header row before each new country
+    write_new_customers_by_country(new_records, seen_countries, output_file_path)
+accumulated_store.close()
 
 # Save the set of seen countries
 with open(seen_countries_file_path, "w") as file:
@@ -86,21 +77,17 @@ with open(seen_countries_file_path, "w") as file:
 today = datetime.now().strftime("%Y-%m-%d")
 summary = {
     "Date": today,
-    "New Records": len(new_records),
-    "Carryover Records": len(carryover_records),
-    "Deleted Records": len(deleted_records),
+    "New Records": new_count,
+    "Carryover Records": carryover_count,
+    "Deleted Records": deleted_count,
+    "Modified Records": modified_count,
 }
 
-# Convert summary to a DataFrame
-summary_df = pd.DataFrame([summary])
-
-# Save the summary to a CSV file, appending if the file exists
-if os.path.exists(summary_file_path):
-    summary_df.to_csv(summary_file_path, mode="a", header=False, index=False)
-else:
-    summary_df.to_csv(summary_file_path, index=False)
+# Append the summary to the CSV file; a file from before "Modified Records" is moved
+# to the current header first
+append_summaries(summary_file_path, [summary])
 
 print(f"Transformed data saved to {output_file_path}")
-print(f"Accumulated data updated at {accumulated_file_path}")
+print(f"Accumulated data updated at {accumulated_store_path}")
 print(f"Seen countries updated at {seen_countries_file_path}")
 print(f"Summary of changes saved to {summary_file_path}")
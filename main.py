@@ -1,29 +1,81 @@
 from config import *
 from data_processing import read_csv_data, process_rd_csv
-from report_generation import generate_html_report
-from email_sender import send_outlook_email
+from aggregation import VulnerabilityAggregate, aggregate_csv
+from columnar import read_columnar_data
+from incremental import refresh_aggregate
+from parallel import aggregate_csv_parallel
+from report_generation import write_html_report
+from metrics_store import MetricsStore
+from email_sender import RetrySpool, send_email
+from instrumentation import configure as configure_instrumentation, stage, write_run_log, write_chrome_trace
+
+def check_config():
+    # A bounded aggregate cannot take rows out again or be saved, which incremental mode needs
+    if INCREMENTAL_MODE and (TOP_N_MODE != 'exact' or DISTINCT_COUNT_MODE != 'exact'):
+        raise ValueError(f"INCREMENTAL_MODE needs TOP_N_MODE and DISTINCT_COUNT_MODE set to 'exact', "
+                         f"not {TOP_N_MODE!r} and {DISTINCT_COUNT_MODE!r}")
 
 def main():
+    check_config()
+    configure_instrumentation(INSTRUMENTATION_ENABLED, INSTRUMENTATION_TRACE_MEMORY)
+    
     # Read vulnerability data
-    vulnerability_data = read_csv_data(CSV_FILE_PATH)
+    with stage('read_vulnerabilities') as record:
+        if INCREMENTAL_MODE:
+            vulnerability_data, delta = refresh_aggregate(CSV_FILE_PATH, AGGREGATE_STATE_PATH)
+            record.details = delta.as_dict()
+        elif AGGREGATION_WORKERS > 1:
+            vulnerability_data = aggregate_csv_parallel(CSV_FILE_PATH, AGGREGATION_WORKERS)
+        elif STREAMING_MODE:
+            vulnerability_data = aggregate_csv(CSV_FILE_PATH, CSV_CHUNK_SIZE)
+        elif CSV_CACHE_ENABLED and TOP_N_MODE == 'exact' and DISTINCT_COUNT_MODE == 'exact':
+            # The cache's typed columns are counted directly, without building a dict per row
+            vulnerability_data = VulnerabilityAggregate.from_table(read_columnar_data(CSV_FILE_PATH))
+        else:
+            vulnerability_data = read_csv_data(CSV_FILE_PATH)
+        record.rows = len(vulnerability_data)
+    
+    # The aggregate is needed again for the metrics history after the report is written
+    if not isinstance(vulnerability_data, VulnerabilityAggregate):
+        with stage('aggregate_vulnerabilities') as record:
+            vulnerability_data = VulnerabilityAggregate.from_rows(vulnerability_data)
+            record.rows = len(vulnerability_data)
     
     # Read and process application deliverables data
-    rd_data, owner_summary = process_rd_csv(RD_CSV_FILE_PATH)
+    with stage('read_deliverables') as record:
+        rd_data, owner_summary = process_rd_csv(RD_CSV_FILE_PATH)
+        record.rows = rd_data.rows
     
-    # Generate HTML report
-    report_html = generate_html_report(vulnerability_data, rd_data, owner_summary)
+    metrics_store = MetricsStore(METRICS_STORE_PATH) if METRICS_STORE_PATH else None
     
-    # Save report to file
-    with open(OUTPUT_REPORT_PATH, 'w', encoding='utf-8') as f:
-        f.write(report_html)
+    # Generate the HTML report straight into the output file
+    with stage('render_report'):
+        with open(OUTPUT_REPORT_PATH, 'w', encoding='utf-8') as f:
+            write_html_report(f, vulnerability_data, rd_data, owner_summary, metrics_store)
     
     # Send email
-    try:
-        send_outlook_email(EMAIL_SUBJECT, report_html, EMAIL_RECIPIENTS)
-        print("Report sent successfully via Outlook!")
-    except Exception as e:
-        print(f"An error occurred while sending the email: {str(e)}")
-        print(f"The report has been saved as '{OUTPUT_REPORT_PATH}' in the current directory.")
+    with stage('send_email'):
+        try:
+            with open(OUTPUT_REPORT_PATH, 'r', encoding='utf-8') as f:
+                report_html = f.read()
+            if send_email(EMAIL_SUBJECT, report_html, EMAIL_RECIPIENTS, spool=RetrySpool()):
+                print(f"Report sent successfully via {MAIL_TRANSPORT}!")
+            else:
+                print(f"The report has been queued in '{MAIL_SPOOL_DIR}'; run email_sender.py to retry sending it.")
+        except Exception as e:
+            print(f"An error occurred while sending the email: {str(e)}")
+            print(f"The report has been saved as '{OUTPUT_REPORT_PATH}' in the current directory.")
+
+    # Append this run's metrics to the trend history
+    if metrics_store is not None:
+        with stage('record_metrics'):
+            metrics_store.record_run(vulnerability_data, rd_data)
+            metrics_store.close()
+
+    if INSTRUMENTATION_ENABLED:
+        write_run_log(RUN_LOG_PATH)
+        if CHROME_TRACE_PATH:
+            write_chrome_trace(CHROME_TRACE_PATH)
 
     print("Process completed.")
 
@@ -0,0 +1,111 @@
+import sqlite3
+from datetime import datetime
+from config import PRIORITY_LEVELS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    unique_vulnerabilities INTEGER NOT NULL,
+    affected_hosts INTEGER NOT NULL,
+    past_due INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    metric TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metrics_by_run ON metrics (metric, run_id);
+CREATE INDEX IF NOT EXISTS metrics_by_key ON metrics (metric, key, run_id);
+"""
+
+def snapshot_metrics(aggregate, deliverables=None, today=None):
+    """(metric, key, value) rows describing one aggregate and, optionally, the deliverables."""
+    for priority, count in aggregate.priority_count.items():
+        yield 'priority', priority, count
+    for app_id, app in aggregate.apps.groups.items():
+        yield 'app', app_id, app['total']
+        yield 'app_priority_1', app_id, app['priorities'][PRIORITY_LEVELS[0]]
+        yield 'app_past_due', app_id, aggregate.app_past_due(app_id, today)
+    # Per-host totals come from the per-priority counts, which every mode keeps per key
+    # (`host_count` is only a distinct counter in approximate mode); in heavy-hitters mode
+    # they are the monitored hosts' estimates
+    host_totals = {}
+    for hosts in aggregate.hosts_by_priority.values():
+        for host, count in hosts.most_common():
+            host_totals[host] = host_totals.get(host, 0) + count
+    for host, count in host_totals.items():
+        yield 'host', host, count
+    if deliverables is not None:
+        condition_totals = {}
+        for owner, conditions in deliverables.owner_summary.items():
+            for condition, count in conditions.items():
+                condition_totals[condition] = condition_totals.get(condition, 0) + count
+        for condition, count in condition_totals.items():
+            yield 'condition', condition, count
+
+class MetricsStore:
+    """Append-only history of report metrics in SQLite, one snapshot per run.
+
+    Snapshots are never updated; every query reads a bounded number of recent runs
+    through an index, so it stays fast however long the history grows.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record_run(self, aggregate, deliverables=None, recorded_at=None):
+        recorded_at = recorded_at or datetime.now()
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (recorded_at, snapshot_date, total, unique_vulnerabilities, affected_hosts, past_due) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (recorded_at.isoformat(timespec='seconds'), recorded_at.date().isoformat(), aggregate.total,
+                 aggregate.unique_vulnerabilities, aggregate.affected_hosts, aggregate.past_due()))
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO metrics (run_id, metric, key, value) VALUES (?, ?, ?, ?)",
+                ((run_id, metric, key, value) for metric, key, value in snapshot_metrics(aggregate, deliverables)))
+        return run_id
+
+    def recent_runs(self, limit):
+        """The latest `limit` runs, oldest first, each with its per-priority counts."""
+        rows = self.connection.execute(
+            "SELECT run_id, snapshot_date, total, unique_vulnerabilities, affected_hosts, past_due "
+            "FROM runs ORDER BY run_id DESC LIMIT ?", (limit,)).fetchall()
+        if not rows:
+            return []
+        runs = {row[0]: {'run_id': row[0], 'snapshot_date': row[1], 'total': row[2],
+                         'unique_vulnerabilities': row[3], 'affected_hosts': row[4], 'past_due': row[5],
+                         'priorities': {}}
+                for row in reversed(rows)}
+        for run_id, priority, count in self.connection.execute(
+                "SELECT run_id, key, value FROM metrics WHERE metric = 'priority' AND run_id >= ?", (rows[-1][0],)):
+            runs[run_id]['priorities'][priority] = count
+        return list(runs.values())
+
+    def trend(self, metric, key, limit):
+        """(snapshot date, value) of one metric key over the latest `limit` runs, oldest first."""
+        rows = self.connection.execute(
+            "SELECT runs.snapshot_date, metrics.value FROM metrics JOIN runs USING (run_id) "
+            "WHERE metrics.metric = ? AND metrics.key = ? ORDER BY metrics.run_id DESC LIMIT ?",
+            (metric, key, limit)).fetchall()
+        return rows[::-1]
+
+    def values_at(self, metric, run_id):
+        """Every key's value of one metric in one run."""
+        return dict(self.connection.execute(
+            "SELECT key, value FROM metrics WHERE metric = ? AND run_id = ?", (metric, run_id)))
@@ -1,118 +1,279 @@
+import argparse
+import filecmp
 import os
-from datetime import datetime
+import re
+import shutil
+import tempfile
+from contextlib import chdir
+from datetime import date, timedelta
 
 import pandas as pd
 
+from change_summary import append_summaries
+from country_output import write_new_customers_by_country
+from customer_store import CustomerStore
+
 # Paths to your files
 accumulated_file_path = "accumulated_customers.csv"
+accumulated_store_path = "accumulated_customers.sqlite"
 output_file_path = "sorted_new_customers_by_country.csv"
 seen_countries_file_path = "seen_countries.txt"
 summary_file_path = "summary_of_changes.csv"
 
+# Where a backfill writes each day's output; {day} is the daily file's name without .csv
+backfill_output_file_path = "sorted_new_customers_by_country_{day}.csv"
 
-# Function to process data for a given day
-def process_daily_data(new_data_file_path):
-    # Load the accumulated data
-    try:
-        accumulated_data = pd.read_csv(accumulated_file_path)
-    except FileNotFoundError:
-        accumulated_data = (
-            pd.DataFrame()
-        )  # If the file does not exist, create an empty DataFrame
+# A date in a daily file's name, as 2024-01-31 or 20240131
+file_date_pattern = re.compile(r"(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)")
 
-    # Load the new data
-    new_data = pd.read_csv(new_data_file_path)
 
-    # Load the set of seen countries
+def load_seen_countries():
     if os.path.exists(seen_countries_file_path):
         with open(seen_countries_file_path, "r") as file:
-            seen_countries = set(file.read().splitlines())
-    else:
-        seen_countries = set()
-
-    # Identify new records by comparing the new data with the accumulated data
-    if not accumulated_data.empty:
-        new_records = new_data[
-            ~new_data["Customer Id"].isin(accumulated_data["Customer Id"])
-        ]
-        carryover_records = new_data[
-            new_data["Customer Id"].isin(accumulated_data["Customer Id"])
-        ]
-        deleted_records = accumulated_data[
-            ~accumulated_data["Customer Id"].isin(new_data["Customer Id"])
-        ]
-    else:
-        new_records = new_data
-        carryover_records = pd.DataFrame()
-        deleted_records = pd.DataFrame()
+            return set(file.read().splitlines())
+    return set()
 
-    # Combine carryover records and new records to form the updated accumulated data
-    updated_accumulated_data = pd.concat(
-        [carryover_records, new_records]
-    ).drop_duplicates()
 
-    # Sort the new records by 'Country'
-    sorted_new_records = new_records.sort_values(by="Country")
+def save_seen_countries(seen_countries):
+    with open(seen_countries_file_path, "w") as file:
+        for country in seen_countries:
+            file.write(f"{country}\n")
 
-    # Prepare a new list to hold the transformed data
-    output_data = []
 
-    # Get the unique countries in the new data
-    new_countries = sorted_new_records["Country"].unique()
+def save_summaries(summaries):
+    # Append to the summary file, moving one from before "Modified Records" to the
+    # current header first
+    append_summaries(summary_file_path, summaries)
 
-    # Get the unique countries in the accumulated data
-    existing_countries = (
-        carryover_records["Country"].unique() if not carryover_records.empty else []
-    )
 
-    # Iterate over each unique country and add the country name row if it is a new country
-    for country in new_countries:
-        if country not in seen_countries:
-            output_data.append({"Country": f"Here are all the records for {country}"})
-            seen_countries.add(country)  # Update the set of seen countries
-        country_data = sorted_new_records[sorted_new_records["Country"] == country]
-        output_data.extend(country_data.to_dict(orient="records"))
+def file_date(new_data_file_path):
+    match = file_date_pattern.search(os.path.basename(new_data_file_path))
+    if match is None:
+        return None
+    try:
+        return date(*map(int, match.groups()))
+    except ValueError:
+        return None
 
-    # Convert the output data back to a DataFrame
-    output_df = pd.DataFrame(output_data)
 
-    # Save the transformed data to a new CSV file
-    output_df.to_csv(output_file_path, index=False)
+# The date each daily file's summary is stamped with: the date in its name, or else
+# consecutive days from start_date (by default ending today, as if the files had been
+# processed one per day up to now)
+def summary_dates(new_data_file_paths, start_date=None):
+    if start_date is None:
+        start_date = date.today() - timedelta(days=len(new_data_file_paths) - 1)
+    return [
+        file_date(path) or start_date + timedelta(days=index)
+        for index, path in enumerate(new_data_file_paths)
+    ]
 
-    # Save the updated accumulated data
-    updated_accumulated_data.to_csv(accumulated_file_path, index=False)
 
-    # Save the set of seen countries
-    with open(seen_countries_file_path, "w") as file:
-        for country in seen_countries:
-            file.write(f"{country}\n")
+# Update the accumulated data with one day's file and write that day's output
+def process_day(
+    accumulated_store,
+    new_data_file_path,
+    seen_countries,
+    day_output_file_path,
+    summary_date,
+):
+    # Load the new data
+    new_data = pd.read_csv(new_data_file_path)
+
+    # Identify new, carryover, modified and deleted records and update the accumulated data
+    # in place: only new and modified rows are written and removed ones deleted
+    (
+        new_records,
+        carryover_records,
+        modified_records,
+        deleted_records,
+    ) = accumulated_store.sync(new_data)
+
+    # Write the new records sorted by country, with a header row before each new country
+    write_new_customers_by_country(new_records, seen_countries, day_output_file_path)
 
-    # Prepare the summary of changes with a date stamp
-    today = datetime.now().strftime("%Y-%m-%d")
-    summary = {
-        "Date": today,
+    # Prepare the summary of changes, stamped with the day the file is for
+    return {
+        "Date": summary_date.strftime("%Y-%m-%d"),
         "New Records": len(new_records),
         "Carryover Records": len(carryover_records),
         "Deleted Records": len(deleted_records),
+        "Modified Records": len(modified_records),
     }
 
-    # Convert summary to a DataFrame
-    summary_df = pd.DataFrame([summary])
 
-    # Save the summary to a CSV file, appending if the file exists
-    if os.path.exists(summary_file_path):
-        summary_df.to_csv(summary_file_path, mode="a", header=False, index=False)
-    else:
-        summary_df.to_csv(summary_file_path, index=False)
+# Function to process data for a given day; the summary is dated from the file's name,
+# or today if it has no date in it
+def process_daily_data(new_data_file_path, summary_date=None):
+    if summary_date is None:
+        summary_date = file_date(new_data_file_path) or date.today()
+
+    # Open the accumulated data; a previous run's CSV is imported into the store once
+    accumulated_store = CustomerStore(accumulated_store_path)
+    accumulated_store.import_csv(accumulated_file_path)
+
+    seen_countries = load_seen_countries()
+    summary = process_day(
+        accumulated_store,
+        new_data_file_path,
+        seen_countries,
+        output_file_path,
+        summary_date,
+    )
+    accumulated_store.close()
+
+    save_seen_countries(seen_countries)
+    save_summaries([summary])
 
     print(f"Processed data from {new_data_file_path}")
     print(f"Transformed data saved to {output_file_path}")
-    print(f"Accumulated data updated at {accumulated_file_path}")
+    print(f"Accumulated data updated at {accumulated_store_path}")
     print(f"Seen countries updated at {seen_countries_file_path}")
     print(f"Summary of changes saved to {summary_file_path}")
 
 
-# Simulate running the script for each day
-for day in range(1, 4):
-    new_data_file_path = f"day_{day}_customers.csv"
-    process_daily_data(new_data_file_path)
+def backfill_output_path(new_data_file_path):
+    day = os.path.splitext(os.path.basename(new_data_file_path))[0]
+    return backfill_output_file_path.format(day=day)
+
+
+# Process many daily files in order, keeping the accumulated data and seen countries in
+# memory between days; only the per-day outputs are written until the end, when the
+# accumulated store, seen countries and summaries are saved once
+def backfill(new_data_file_paths, dates=None):
+    if dates is None:
+        dates = summary_dates(new_data_file_paths)
+    accumulated_store = CustomerStore.in_memory(accumulated_store_path)
+    accumulated_store.import_csv(accumulated_file_path)
+    seen_countries = load_seen_countries()
+
+    summaries = []
+    for new_data_file_path, summary_date in zip(new_data_file_paths, dates):
+        summaries.append(
+            process_day(
+                accumulated_store,
+                new_data_file_path,
+                seen_countries,
+                backfill_output_path(new_data_file_path),
+                summary_date,
+            )
+        )
+        print(f"Processed data from {new_data_file_path}")
+
+    accumulated_store.save(accumulated_store_path)
+    accumulated_store.close()
+    save_seen_countries(seen_countries)
+    save_summaries(summaries)
+
+    print(f"Accumulated data saved to {accumulated_store_path}")
+    print(f"Seen countries saved to {seen_countries_file_path}")
+    print(f"Summary of changes saved to {summary_file_path}")
+
+
+# Run the same files day by day and as a backfill in scratch directories, starting from
+# the current accumulated data, and return the differences between the two (none if the
+# backfill is correct); both runs stamp each file's summary with the same date
+def check_backfill(new_data_file_paths, dates=None):
+    if dates is None:
+        dates = summary_dates(new_data_file_paths)
+    new_data_file_paths = [os.path.abspath(path) for path in new_data_file_paths]
+    state_file_paths = [
+        accumulated_file_path,
+        accumulated_store_path,
+        seen_countries_file_path,
+    ]
+    differences = []
+    with tempfile.TemporaryDirectory() as directory:
+        daily_directory = os.path.join(directory, "daily")
+        backfill_directory = os.path.join(directory, "backfill")
+        for run_directory in (daily_directory, backfill_directory):
+            os.makedirs(run_directory)
+            for path in state_file_paths:
+                if os.path.exists(path):
+                    shutil.copy(path, run_directory)
+
+        with chdir(daily_directory):
+            for new_data_file_path, summary_date in zip(new_data_file_paths, dates):
+                process_daily_data(new_data_file_path, summary_date)
+                shutil.copy(output_file_path, backfill_output_path(new_data_file_path))
+        with chdir(backfill_directory):
+            backfill(new_data_file_paths, dates)
+
+        for new_data_file_path in new_data_file_paths:
+            day_output_file_path = backfill_output_path(new_data_file_path)
+            if not filecmp.cmp(
+                os.path.join(daily_directory, day_output_file_path),
+                os.path.join(backfill_directory, day_output_file_path),
+                shallow=False,
+            ):
+                differences.append(day_output_file_path)
+        if not filecmp.cmp(
+            os.path.join(daily_directory, summary_file_path),
+            os.path.join(backfill_directory, summary_file_path),
+            shallow=False,
+        ):
+            differences.append(summary_file_path)
+
+        seen = []
+        accumulated = []
+        for run_directory in (daily_directory, backfill_directory):
+            with open(os.path.join(run_directory, seen_countries_file_path)) as file:
+                seen.append(set(file.read().splitlines()))
+            with CustomerStore(
+                os.path.join(run_directory, accumulated_store_path)
+            ) as accumulated_store:
+                accumulated.append(
+                    accumulated_store.to_frame()
+                    .sort_values(accumulated_store.key_column)
+                    .reset_index(drop=True)
+                )
+        if seen[0] != seen[1]:
+            differences.append(seen_countries_file_path)
+        if not accumulated[0].equals(accumulated[1]):
+            differences.append(accumulated_store_path)
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay daily customer files, one run per day or as one backfill."
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        default=[f"day_{day}_customers.csv" for day in range(1, 4)],
+        help="daily files, oldest first",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="process every file in memory and save the accumulated data once",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare a backfill with day-by-day runs without changing any files here",
+    )
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        help="date of the first file's summary (YYYY-MM-DD), for files without a date "
+        "in their name; by default the last file is dated today",
+    )
+    args = parser.parse_args()
+    dates = summary_dates(args.files, args.start_date)
+
+    if args.check:
+        differences = check_backfill(args.files, dates)
+        if differences:
+            raise SystemExit(f"Backfill differs from day-by-day runs in: {differences}")
+        print("Backfill matches day-by-day runs")
+    elif args.backfill:
+        backfill(args.files, dates)
+    else:
+        # Simulate running the script for each day
+        for new_data_file_path, summary_date in zip(args.files, dates):
+            process_daily_data(new_data_file_path, summary_date)
+
+
+if __name__ == "__main__":
+    main()
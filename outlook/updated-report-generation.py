@@ -5,32 +5,17 @@ This module is responsible for generating the HTML report based on the processed
 It uses Jinja2 for templating to create a more flexible and maintainable report.
 """
 
-from typing import List, Dict, Any
-from collections import Counter
-from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
+from typing import Iterable, List, Dict, Any, Tuple, Union
 from config import (
     HTML_TEMPLATE_PATH,
     CSS_STYLE_PATH,
     PRIORITY_LEVELS,
     TOP_VULNERABILITIES_COUNT,
     TOP_SERVERS_COUNT,
-    DUE_DATE_TIME_FRAMES,
-    COLUMN_TITLE,
-    COLUMN_SEVERITY_RISK,
-    COLUMN_APPLICATION_ID,
-    COLUMN_APPLICATION_FULL_NAME,
-    COLUMN_DUE_DATE,
-    COLUMN_HOST_NAME,
-    COLUMN_SOURCES
-)
-from data_processing import (
-    get_host_or_source,
-    is_non_server_vuln,
-    get_top_vulnerable_hosts,
-    get_due_date_outlook,
-    parse_date
+    DUE_DATE_TIME_FRAMES
 )
+from aggregation import VulnerabilityAggregate
+from templates import LazyContext, get_jinja_template
 
 def get_condition_class(condition: str) -> str:
     """
@@ -51,27 +36,49 @@ def get_condition_class(condition: str) -> str:
     else:
         return ''
 
-def generate_executive_summary(data: List[Dict[str, str]], owner_summary: Dict[str, Dict[str, int]]) -> str:
+def get_aggregate(data: Union[List[Dict[str, str]], VulnerabilityAggregate]) -> VulnerabilityAggregate:
+    """
+    Return the single-pass aggregate for the vulnerability data, building it if needed.
+
+    Args:
+        data (Union[List[Dict[str, str]], VulnerabilityAggregate]): Vulnerability rows or an existing aggregate.
+
+    Returns:
+        VulnerabilityAggregate: The aggregate shared by every report section.
+    """
+    if isinstance(data, VulnerabilityAggregate):
+        return data
+    return VulnerabilityAggregate.from_rows(data)
+
+def generate_executive_summary(aggregate: VulnerabilityAggregate, owner_summary: Dict[str, Dict[str, int]]) -> str:
     """
     Generate the executive summary for the security vulnerability report.
 
     Args:
-        data (List[Dict[str, str]]): List of vulnerability data dictionaries.
+        aggregate (VulnerabilityAggregate): Aggregated vulnerability counts.
         owner_summary (Dict[str, Dict[str, int]]): Summary of deliverables by owner.
 
     Returns:
         str: HTML string containing the executive summary.
     """
-    total_vulnerabilities = len(data)
-    unique_vulnerabilities = len(set((row[COLUMN_TITLE], row[COLUMN_SEVERITY_RISK]) for row in data))
-    affected_hosts = len(set(get_host_or_source(row) for row in data if not is_non_server_vuln(row)))
-    priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in data)
-    
-    today = datetime.now().date()
-    past_due_vulnerabilities = sum(1 for row in data if parse_date(row[COLUMN_DUE_DATE]).date() < today)
+    return prepare_report_data(aggregate, {}, owner_summary)['executive_summary']
+
+def render_executive_summary(context: LazyContext) -> str:
+    """
+    Render the executive summary from the totals already in the report context.
+
+    Args:
+        context (LazyContext): The report context built by `prepare_report_data`.
 
-    total_deliverables = sum(sum(conditions.values()) for conditions in owner_summary.values())
-    past_due_deliverables = sum(sum(count for cond, count in conditions.items() if 'Past Due' in cond) for conditions in owner_summary.values())
+    Returns:
+        str: HTML string containing the executive summary.
+    """
+    total_vulnerabilities = context['total_vulnerabilities']
+    unique_vulnerabilities = context['unique_vulnerabilities']
+    affected_hosts = context['affected_hosts']
+    past_due_vulnerabilities = context['past_due_vulnerabilities']
+    total_deliverables = context['total_deliverables']
+    past_due_deliverables = context['past_due_deliverables']
     
     summary = f"""
     <h2>Executive Summary</h2>
@@ -90,9 +97,8 @@ def generate_executive_summary(data: List[Dict[str, str]], owner_summary: Dict[s
     <ul>
     """
     
-    for priority in PRIORITY_LEVELS:
-        count = priority_count[priority]
-        percentage = count / total_vulnerabilities * 100
+    for priority, count, share in context['priority_breakdown']:
+        percentage = share * 100
         priority_class = priority.lower().replace(' ', '-')
         summary += f'<li class="{priority_class}">{priority}: <strong>{count}</strong> ({percentage:.1f}%)</li>'
     
@@ -108,7 +114,7 @@ def generate_executive_summary(data: List[Dict[str, str]], owner_summary: Dict[s
     <tr><th>Owner</th><th>Condition</th><th>Count</th></tr>
     """
     
-    for owner, conditions in owner_summary.items():
+    for owner, conditions in context['owner_deliverables'].items():
         critical_conditions = {cond: count for cond, count in conditions.items() if 'Past Due' in cond or 'Due 0 to 10 Days' in cond}
         if critical_conditions:
             for cond, count in critical_conditions.items():
@@ -125,89 +131,94 @@ def generate_executive_summary(data: List[Dict[str, str]], owner_summary: Dict[s
     
     return summary
 
-def prepare_report_data(data: List[Dict[str, str]], rd_data: Dict[str, Dict[str, List[Dict[str, str]]]], owner_summary: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+def prepare_report_data(data: Union[List[Dict[str, str]], VulnerabilityAggregate], rd_data: Dict[str, Dict[str, List[Dict[str, str]]]], owner_summary: Dict[str, Dict[str, int]]) -> LazyContext:
     """
     Prepare the data for the Jinja2 template.
 
+    Nothing is computed up front: each value is produced the first time the template looks
+    it up and then reused, including by other values (the executive summary reads the same
+    totals as the statistics section), so a template using few sections renders quickly.
+
     Args:
-        data (List[Dict[str, str]]): List of vulnerability data dictionaries.
+        data (Union[List[Dict[str, str]], VulnerabilityAggregate]): Vulnerability rows or an existing aggregate.
         rd_data (Dict[str, Dict[str, List[Dict[str, str]]]]): Processed application deliverables data.
         owner_summary (Dict[str, Dict[str, int]]): Summary of deliverables by owner.
 
     Returns:
-        Dict[str, Any]: A dictionary containing all the data needed for the report template.
-    """
-    total_vulnerabilities = len(data)
-    unique_vulnerabilities = len(set((row[COLUMN_TITLE], row[COLUMN_SEVERITY_RISK]) for row in data))
-    affected_hosts = len(set(get_host_or_source(row) for row in data if not is_non_server_vuln(row)))
-    priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in data)
-    
-    vulnerability_counter = Counter(row[COLUMN_TITLE] for row in data)
-    most_common_vulnerabilities = vulnerability_counter.most_common(TOP_VULNERABILITIES_COUNT)
-    
-    vulnerable_hosts_by_priority = {
-        priority: get_top_vulnerable_hosts(data, priority, TOP_SERVERS_COUNT)
-        for priority in PRIORITY_LEVELS
-    }
-    
-    due_dates_by_priority = {
-        priority: get_due_date_outlook(data, priority, DUE_DATE_TIME_FRAMES)
-        for priority in PRIORITY_LEVELS
-    }
-    
-    app_id_count = Counter(row[COLUMN_APPLICATION_ID] for row in data)
-    vulnerabilities_by_app = []
-    for app_id, count in app_id_count.most_common():
-        app_name = next((row[COLUMN_APPLICATION_FULL_NAME] for row in data if row[COLUMN_APPLICATION_ID] == app_id), "Unknown")
-        app_data = [row for row in data if row[COLUMN_APPLICATION_ID] == app_id]
-        app_priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in app_data)
-        vulnerabilities_by_app.append({
-            'name': app_name,
+        LazyContext: A mapping of everything the report template can use.
+    """
+    def vulnerabilities_by_app() -> List[Dict[str, Any]]:
+        return [{
+            'name': app['name'],
             'id': app_id,
-            'total': count,
-            'priorities': {priority: app_priority_count[priority] for priority in PRIORITY_LEVELS}
-        })
-    
-    executive_summary = generate_executive_summary(data, owner_summary)
-    
-    return {
-        'executive_summary': executive_summary,
-        'total_vulnerabilities': total_vulnerabilities,
-        'unique_vulnerabilities': unique_vulnerabilities,
-        'affected_hosts': affected_hosts,
-        'priority_breakdown': [(priority, priority_count[priority], priority_count[priority]/total_vulnerabilities) for priority in PRIORITY_LEVELS],
-        'most_common_vulnerabilities': most_common_vulnerabilities,
-        'vulnerable_hosts_by_priority': vulnerable_hosts_by_priority,
-        'due_dates_by_priority': due_dates_by_priority,
+            'total': app['total'],
+            'priorities': {priority: app['priorities'][priority] for priority in PRIORITY_LEVELS}
+        } for app_id, app in context['aggregate'].apps_by_count()]
+    
+    def priority_breakdown() -> List[Tuple[str, int, float]]:
+        total_vulnerabilities = context['total_vulnerabilities']
+        priority_count = context['aggregate'].priority_count
+        return [(priority, priority_count[priority], priority_count[priority]/total_vulnerabilities)
+                for priority in PRIORITY_LEVELS]
+    
+    context = LazyContext({
+        'aggregate': lambda: get_aggregate(data),
+        'executive_summary': lambda: render_executive_summary(context),
+        'total_vulnerabilities': lambda: context['aggregate'].total,
+        'unique_vulnerabilities': lambda: context['aggregate'].unique_vulnerabilities,
+        'affected_hosts': lambda: context['aggregate'].affected_hosts,
+        'past_due_vulnerabilities': lambda: context['aggregate'].past_due(),
+        'priority_breakdown': priority_breakdown,
+        'most_common_vulnerabilities': lambda: context['aggregate'].most_common_titles(TOP_VULNERABILITIES_COUNT),
+        'vulnerable_hosts_by_priority': lambda: {
+            priority: context['aggregate'].top_hosts(priority, TOP_SERVERS_COUNT)
+            for priority in PRIORITY_LEVELS
+        },
+        'due_dates_by_priority': lambda: {
+            priority: context['aggregate'].due_date_outlook(priority, DUE_DATE_TIME_FRAMES)
+            for priority in PRIORITY_LEVELS
+        },
         'vulnerabilities_by_app': vulnerabilities_by_app,
-        'owner_deliverables': owner_summary
-    }
+        'total_deliverables': lambda: sum(sum(conditions.values()) for conditions in owner_summary.values()),
+        'past_due_deliverables': lambda: sum(sum(count for cond, count in conditions.items() if 'Past Due' in cond)
+                                             for conditions in owner_summary.values())
+    }, owner_deliverables=owner_summary, get_condition_class=get_condition_class)
+    return context
 
-def generate_html_report(data: List[Dict[str, str]], rd_data: Dict[str, Dict[str, List[Dict[str, str]]]], owner_summary: Dict[str, Dict[str, int]]) -> str:
+def generate_html_report(data: Union[List[Dict[str, str]], VulnerabilityAggregate], rd_data: Dict[str, Dict[str, List[Dict[str, str]]]], owner_summary: Dict[str, Dict[str, int]]) -> str:
     """
     Generate the complete HTML report using Jinja2 templating.
 
     Args:
-        data (List[Dict[str, str]]): List of vulnerability data dictionaries.
+        data (Union[List[Dict[str, str]], VulnerabilityAggregate]): Vulnerability rows or an existing aggregate.
         rd_data (Dict[str, Dict[str, List[Dict[str, str]]]]): Processed application deliverables data.
         owner_summary (Dict[str, Dict[str, int]]): Summary of deliverables by owner.
 
     Returns:
         str: Complete HTML report as a string.
     """
-    # Set up Jinja2 environment
-    env = Environment(loader=FileSystemLoader('.'))
-    template = env.get_template(HTML_TEMPLATE_PATH)
-    
-    # Read CSS styles
-    with open(CSS_STYLE_PATH, 'r') as f:
-        styles = f.read()
+    # Compiled once per process and cached on disk; the CSS is read once
+    template = get_jinja_template(HTML_TEMPLATE_PATH, CSS_STYLE_PATH)
     
-    # Prepare data for the template
+    # Prepare data for the template; sections are computed as the template reaches them
     report_data = prepare_report_data(data, rd_data, owner_summary)
     
     # Render the template
-    return template.render(styles=styles, get_condition_class=get_condition_class, **report_data)
+    return template.render_context(report_data)
+
+def generate_html_reports(reports: Iterable[Tuple[Union[List[Dict[str, str]], VulnerabilityAggregate], Dict[str, Dict[str, List[Dict[str, str]]]], Dict[str, Dict[str, int]]]]) -> Iterable[str]:
+    """
+    Render many reports (e.g. one per application) from the same compiled template.
+
+    Args:
+        reports (Iterable[Tuple[...]]): (data, rd_data, owner_summary) for each report.
+
+    Returns:
+        Iterable[str]: The rendered HTML reports, in the order given.
+    """
+    template = get_jinja_template(HTML_TEMPLATE_PATH, CSS_STYLE_PATH)
+    contexts = (prepare_report_data(data, rd_data, owner_summary) for data, rd_data, owner_summary in reports)
+    return template.render_many(contexts)
 
 if __name__ == "__main__":
     # Add any testing or debugging code here
@@ -0,0 +1,69 @@
+import csv
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+from aggregation import VulnerabilityAggregate
+
+# Each worker gets several byte ranges so one slow range does not hold up the pool
+RANGES_PER_WORKER = 4
+
+def split_byte_ranges(file_path, parts):
+    """Split the data rows of a CSV into about `parts` (start, end) byte ranges on line boundaries.
+
+    Assumes no quoted field contains a line break, which holds for the scanner exports.
+    Returns the parsed header and the ranges in file order.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        header_line = f.readline()
+        data_start = f.tell()
+        boundaries = [data_start]
+        for part in range(1, parts):
+            target = data_start + (size - data_start) * part // parts
+            if target <= boundaries[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # Finish the line the target falls in
+            position = f.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+        boundaries.append(size)
+
+    encoding = locale.getpreferredencoding(False)
+    fieldnames = next(csv.reader([header_line.decode(encoding)]))
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    return fieldnames, ranges
+
+def _iter_lines(file_path, start, end, encoding):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        for line in f:
+            yield line.decode(encoding)
+            remaining -= len(line)
+            if remaining <= 0:
+                return
+
+def aggregate_byte_range(file_path, start, end, fieldnames):
+    encoding = locale.getpreferredencoding(False)
+    reader = csv.DictReader(_iter_lines(file_path, start, end, encoding), fieldnames=fieldnames)
+    return VulnerabilityAggregate.from_rows(reader)
+
+def aggregate_csv_parallel(file_path, workers):
+    """Aggregate the CSV on a process pool and merge the shard aggregates in file order.
+
+    With exact counts the result is identical to `VulnerabilityAggregate.from_rows(read_csv_data(file_path))`.
+    In heavy-hitters or approximate distinct mode the merged estimates stay within the same
+    error bounds but can differ from the serial ones.
+    """
+    fieldnames, ranges = split_byte_ranges(file_path, workers * RANGES_PER_WORKER)
+    aggregate = VulnerabilityAggregate()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = executor.map(aggregate_byte_range,
+                              [file_path] * len(ranges),
+                              [start for start, _ in ranges],
+                              [end for _, end in ranges],
+                              [fieldnames] * len(ranges))
+        for shard in shards:
+            aggregate.merge(shard)
+    return aggregate
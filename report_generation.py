@@ -1,158 +1,255 @@
-from collections import Counter
-from datetime import datetime
+from html import escape
 from config import *
-from data_processing import get_host_or_source, is_non_server_vuln, get_top_vulnerable_hosts, get_due_date_outlook, parse_date
-
-def generate_executive_summary(data):
-    total_vulnerabilities = len(data)
-    unique_vulnerabilities = len(set((row[COLUMN_TITLE], row[COLUMN_SEVERITY_RISK]) for row in data))
-    affected_hosts = len(set(get_host_or_source(row) for row in data if not is_non_server_vuln(row)))
-    priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in data)
-    app_id_count = Counter(row[COLUMN_APPLICATION_ID] for row in data)
+from aggregation import VulnerabilityAggregate
+from data_processing import ApplicationJoin
+from templates import get_format_template
+from instrumentation import instrumented, stage
+
+PRIORITY_CLASSES = ['priority-high', 'priority-medium', 'priority-low']
+
+# Chunks are joined and written in batches of this many when streaming to a file
+WRITE_BATCH_CHUNKS = 1024
+
+def share(count, total):
+    # A per-application report can have deliverables but no vulnerabilities
+    return count/total if total else 0
+
+@instrumented()
+def iter_executive_summary(aggregate):
+    total_vulnerabilities = aggregate.total
+    unique_vulnerabilities = aggregate.unique_vulnerabilities
+    affected_hosts = aggregate.affected_hosts
+    priority_count = aggregate.priority_count
     
-    top_app_ids = app_id_count.most_common(TOP_APP_IDS_COUNT)
+    top_app_ids = aggregate.apps_by_count(TOP_APP_IDS_COUNT)
     
-    today = datetime.now().date()
-    past_due = sum(1 for row in data if parse_date(row[COLUMN_DUE_DATE]).date() < today)
+    past_due = aggregate.past_due()
     
-    summary = f"""
+    yield f"""
     <h2>Executive Summary</h2>
     <p>This report covers {total_vulnerabilities} total vulnerabilities, including {unique_vulnerabilities} unique vulnerabilities across {affected_hosts} hosts/sources.</p>
     <p><strong class="priority-high">Past Due Vulnerabilities: {past_due}</strong></p>
     <ul>
     """
     
-    for priority, class_name in zip(PRIORITY_LEVELS, ['priority-high', 'priority-medium', 'priority-low']):
+    for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES):
         count = priority_count[priority]
-        summary += f'<li class="{class_name}">{priority}: {count} ({count/total_vulnerabilities:.1%})</li>'
+        yield f'<li class="{class_name}">{priority}: {count} ({share(count, total_vulnerabilities):.1%})</li>'
     
-    summary += """
+    yield """
     </ul>
     <p>Top Applications by vulnerability count:</p>
     <ul>
     """
     
-    for app_id, count in top_app_ids:
-        app_name = next((row[COLUMN_APPLICATION_FULL_NAME] for row in data if row[COLUMN_APPLICATION_ID] == app_id), "Unknown")
-        app_data = [row for row in data if row[COLUMN_APPLICATION_ID] == app_id]
-        app_priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in app_data)
+    for app_id, app in top_app_ids:
+        app_priority_count = app['priorities']
         priority_breakdown = " | ".join(f'<span class="{class_name}">{priority}: {app_priority_count[priority]}</span>' 
-                                        for priority, class_name in zip(PRIORITY_LEVELS, ['priority-high', 'priority-medium', 'priority-low']))
-        summary += f"""<li>
-            <div class="app-name">{app_name} (ID: {app_id}): {count} vulnerabilities</div>
+                                        for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES))
+        yield f"""<li>
+            <div class="app-name">{escape(app['name'])} (ID: {escape(app_id)}): {app['total']} vulnerabilities</div>
             <div class="severity-breakdown">{priority_breakdown}</div>
         </li>"""
     
-    summary += f"""
+    yield f"""
     </ul>
     <p>Immediate action is required to address past due and high-priority vulnerabilities.</p>
     """
-    
-    return summary
+
+def generate_executive_summary(aggregate):
+    return "".join(iter_executive_summary(aggregate))
+
+def iter_html_list(items):
+    yield "<ol>"
+    for item in items:
+        yield f"<li>{escape(str(item[0]))}: {item[1]} instances</li>"
+    yield "</ol>"
 
 def generate_html_list(items):
-    return "<ol>" + "".join(f"<li>{item[0]}: {item[1]} instances</li>" for item in items) + "</ol>"
+    return "".join(iter_html_list(items))
+
+def class_attribute(class_name):
+    return f'class="{class_name}"' if class_name else ''
+
+@instrumented()
+def iter_app_deliverables_html(rd_data, owner_summary):
+    # Escaped owner cells and classed condition cells are built once per distinct value
+    owner_cells = [f"<tr><td>{escape(owner)}</td>" for owner in rd_data.owners.values]
+    condition_cells = [f"<td {class_attribute(class_name)}>{escape(condition)}</td>"
+                       for condition, class_name in zip(rd_data.conditions.values, rd_data.condition_classes)]
+    
+    yield "<h2>Application Deliverables</h2>"
+    for app in rd_data:
+        yield f"<h3>{escape(app)} (ID: {escape(rd_data.app_id(app))})</h3>"
+        yield "<table>"
+        yield "<tr><th>Owner</th><th>Condition</th></tr>"
+        for owner_code, condition_code in rd_data.iter_app(app):
+            yield f"{owner_cells[owner_code]}{condition_cells[condition_code]}</tr>"
+        yield "</table>"
+    
+    yield "<h2>Owner Summary</h2>"
+    yield "<table>"
+    yield "<tr><th>Owner</th><th>Condition</th><th>Count</th></tr>"
+    for owner_code, condition_code, count in owner_summary.iter_counts():
+        yield f"{owner_cells[owner_code]}{condition_cells[condition_code]}<td>{count}</td></tr>"
+    yield "</table>"
 
 def generate_app_deliverables_html(rd_data, owner_summary):
-    html = "<h2>Application Deliverables</h2>"
-    for app, app_data in rd_data.items():
-        html += f"<h3>{app} (ID: {app_data['AppID']})</h3>"
-        html += "<table>"
-        html += "<tr><th>Owner</th><th>Condition</th></tr>"
-        for deliverable in app_data['Deliverables']:
-            condition_class = ''
-            if 'Past Due' in deliverable['Condition']:
-                condition_class = 'class="priority-high"'
-            elif 'Due 0 to 10 Days' in deliverable['Condition']:
-                condition_class = 'class="priority-medium"'
-            html += f"<tr><td>{deliverable['Owner']}</td><td {condition_class}>{deliverable['Condition']}</td></tr>"
-        html += "</table>"
-    
-    html += "<h2>Owner Summary</h2>"
-    html += "<table>"
-    html += "<tr><th>Owner</th><th>Condition</th><th>Count</th></tr>"
-    for owner, conditions in owner_summary.items():
-        for condition, count in conditions.items():
-            condition_class = ''
-            if 'Past Due' in condition:
-                condition_class = 'class="priority-high"'
-            elif 'Due 0 to 10 Days' in condition:
-                condition_class = 'class="priority-medium"'
-            html += f"<tr><td>{owner}</td><td {condition_class}>{condition}</td><td>{count}</td></tr>"
-    html += "</table>"
-    
-    return html
+    return "".join(iter_app_deliverables_html(rd_data, owner_summary))
 
-def generate_html_report(data, rd_data, owner_summary):
-    with open(HTML_TEMPLATE_PATH, 'r') as f:
-        template = f.read()
-    
-    with open(CSS_STYLE_PATH, 'r') as f:
-        styles = f.read()
-    
-    total_vulnerabilities = len(data)
-    unique_vulnerabilities = len(set((row[COLUMN_TITLE], row[COLUMN_SEVERITY_RISK]) for row in data))
-    affected_hosts = len(set(get_host_or_source(row) for row in data if not is_non_server_vuln(row)))
-    priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in data)
-    app_id_count = Counter(row[COLUMN_APPLICATION_ID] for row in data)
-    
-    vulnerability_counter = Counter(row[COLUMN_TITLE] for row in data)
-    most_common_vulnerabilities = generate_html_list(vulnerability_counter.most_common(TOP_VULNERABILITIES_COUNT))
-    
-    vulnerable_hosts_by_priority = ""
-    due_dates_by_priority = ""
-    for priority, class_name in zip(PRIORITY_LEVELS, ['priority-high', 'priority-medium', 'priority-low']):
-        top_hosts = get_top_vulnerable_hosts(data, priority, TOP_SERVERS_COUNT)
-        vulnerable_hosts_by_priority += f'<h4 class="{class_name}">{priority}</h4>'
+def iter_estimate_note(aggregate, counter, items):
+    # Only heavy-hitters mode gives estimates; exact counts need no note
+    error = aggregate.top_n_error(counter, items)
+    if error:
+        yield f'<p class="estimate-note">Estimated counts; each may be overstated by up to {error}.</p>'
+
+@instrumented()
+def iter_most_common_vulnerabilities(aggregate):
+    most_common = aggregate.most_common_titles(TOP_VULNERABILITIES_COUNT)
+    yield from iter_html_list(most_common)
+    yield from iter_estimate_note(aggregate, aggregate.title_count, most_common)
+
+@instrumented()
+def iter_vulnerable_hosts_by_priority(aggregate):
+    for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES):
+        top_hosts = aggregate.top_hosts(priority, TOP_SERVERS_COUNT)
+        yield f'<h4 class="{class_name}">{priority}</h4>'
         if top_hosts:
-            vulnerable_hosts_by_priority += generate_html_list(top_hosts)
+            yield from iter_html_list(top_hosts)
+            yield from iter_estimate_note(aggregate, aggregate.hosts_by_priority[priority], top_hosts)
         else:
-            vulnerable_hosts_by_priority += "<p>No vulnerabilities found for this priority.</p>"
-        
-        due_date_outlook = get_due_date_outlook(data, priority, DUE_DATE_TIME_FRAMES)
-        due_dates_by_priority += f'<h4 class="{class_name}">{priority}</h4>'
+            yield "<p>No vulnerabilities found for this priority.</p>"
+
+@instrumented()
+def iter_due_dates_by_priority(aggregate):
+    for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES):
+        due_date_outlook = aggregate.due_date_outlook(priority, DUE_DATE_TIME_FRAMES)
+        yield f'<h4 class="{class_name}">{priority}</h4>'
         if sum(count for count, _ in due_date_outlook.values()) > 0:
-            due_dates_by_priority += '<table><tr><th>Outlook</th><th>Vulnerabilities</th><th>Percentage</th></tr>'
+            yield '<table><tr><th>Outlook</th><th>Vulnerabilities</th><th>Percentage</th></tr>'
             if 'past_due' in due_date_outlook:
-                due_dates_by_priority += f'<tr class="priority-high"><td>Past Due</td><td>{due_date_outlook["past_due"][0]}</td><td>{due_date_outlook["past_due"][1]:.1%}</td></tr>'
+                yield f'<tr class="priority-high"><td>Past Due</td><td>{due_date_outlook["past_due"][0]}</td><td>{due_date_outlook["past_due"][1]:.1%}</td></tr>'
             if 'due_today' in due_date_outlook:
-                due_dates_by_priority += f'<tr class="priority-high"><td>Due Today</td><td>{due_date_outlook["due_today"][0]}</td><td>{due_date_outlook["due_today"][1]:.1%}</td></tr>'
+                yield f'<tr class="priority-high"><td>Due Today</td><td>{due_date_outlook["due_today"][0]}</td><td>{due_date_outlook["due_today"][1]:.1%}</td></tr>'
             for days, (count, percentage) in due_date_outlook.items():
                 if days in DUE_DATE_TIME_FRAMES:
-                    due_dates_by_priority += f'<tr><td>Next {days} days</td><td>{count}</td><td>{percentage:.1%}</td></tr>'
-            due_dates_by_priority += "</table>"
+                    yield f'<tr><td>Next {days} days</td><td>{count}</td><td>{percentage:.1%}</td></tr>'
+            yield "</table>"
         else:
-            due_dates_by_priority += "<p>No vulnerabilities found for this priority.</p>"
-    
-    vulnerabilities_by_app = ""
-    for app_id, count in app_id_count.most_common():
-        app_name = next((row[COLUMN_APPLICATION_FULL_NAME] for row in data if row[COLUMN_APPLICATION_ID] == app_id), "Unknown")
-        vulnerabilities_by_app += f"<h4>{app_name} (ID: {app_id})</h4>"
-        vulnerabilities_by_app += f"<p>Total vulnerabilities: {count}</p>"
-        app_data = [row for row in data if row[COLUMN_APPLICATION_ID] == app_id]
-        app_priority_count = Counter(row[COLUMN_SEVERITY_RISK] for row in app_data)
-        vulnerabilities_by_app += "<ul>"
-        for priority, class_name in zip(PRIORITY_LEVELS, ['priority-high', 'priority-medium', 'priority-low']):
-            vulnerabilities_by_app += f'<li class="{class_name}">{priority}: {app_priority_count[priority]}</li>'
-        vulnerabilities_by_app += "</ul>"
-    
-    app_deliverables_html = generate_app_deliverables_html(rd_data, owner_summary)
-    
-    return template.format(
-        styles=styles,
-        executive_summary=generate_executive_summary(data),
+            yield "<p>No vulnerabilities found for this priority.</p>"
+
+@instrumented()
+def iter_vulnerabilities_by_app(aggregate):
+    for app_id, app in aggregate.apps_by_count():
+        app_priority_count = app['priorities']
+        yield f"<h4>{escape(app['name'])} (ID: {escape(app_id)})</h4>"
+        yield f"<p>Total vulnerabilities: {app['total']}</p>"
+        yield "<ul>"
+        for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES):
+            yield f'<li class="{class_name}">{priority}: {app_priority_count[priority]}</li>'
+        yield "</ul>"
+
+@instrumented()
+def iter_application_risk(aggregate, rd_data):
+    ranked = ApplicationJoin(aggregate, rd_data).ranked(APPLICATION_RISK_COUNT)
+    if not ranked:
+        yield "<p>No applications found.</p>"
+        return
+    yield "<table>"
+    yield ("<tr><th>Application</th><th>P1 Vulnerabilities</th><th>Past Due Vulnerabilities</th>"
+           "<th>Past Due Deliverables</th><th>Owners</th></tr>")
+    for app in ranked:
+        yield (f"<tr><td>{escape(app['name'])} (ID: {escape(app['app_id'])})</td>"
+               f'<td class="priority-high">{app["priority_1"]}</td>'
+               f"<td>{app['past_due_vulnerabilities']}</td>"
+               f"<td>{app['past_due_deliverables']}/{app['deliverables']}</td>"
+               f"<td>{escape(', '.join(app['owners']))}</td></tr>")
+    yield "</table>"
+
+@instrumented()
+def iter_trends(aggregate, metrics_store):
+    if metrics_store is None:
+        yield "<p>No run history is kept (METRICS_STORE_PATH is not set).</p>"
+        return
+    history = metrics_store.recent_runs(TREND_RUNS - 1)
+    if not history:
+        yield "<p>No earlier runs recorded yet.</p>"
+        return
+    current = {
+        'snapshot_date': 'This run',
+        'total': aggregate.total,
+        'past_due': aggregate.past_due(),
+        'priorities': aggregate.priority_count
+    }
+    yield "<table>"
+    yield ("<tr><th>Date</th><th>Total</th>"
+           + "".join(f'<th class="{class_name}">{priority}</th>' for priority, class_name in zip(PRIORITY_LEVELS, PRIORITY_CLASSES))
+           + "<th>Past Due</th><th>Change</th></tr>")
+    previous_total = None
+    for run in [*history, current]:
+        change = '' if previous_total is None else f"{run['total'] - previous_total:+d}"
+        previous_total = run['total']
+        yield (f"<tr><td>{escape(run['snapshot_date'])}</td><td>{run['total']}</td>"
+               + "".join(f"<td>{run['priorities'].get(priority, 0)}</td>" for priority in PRIORITY_LEVELS)
+               + f"<td>{run['past_due']}</td><td>{change}</td></tr>")
+    yield "</table>"
+    
+    previous_apps = metrics_store.values_at('app', history[-1]['run_id'])
+    risers = sorted(((app['total'] - previous_apps.get(app_id, 0), app_id, app) for app_id, app in aggregate.apps.groups.items()),
+                    key=lambda riser: riser[0], reverse=True)
+    risers = [riser for riser in risers[:TOP_APP_IDS_COUNT] if riser[0] > 0]
+    if risers:
+        yield f"<p>Largest increases since {escape(history[-1]['snapshot_date'])}:</p>"
+        yield "<ul>"
+        for increase, app_id, app in risers:
+            yield f"<li>{escape(app['name'])} (ID: {escape(app_id)}): +{increase} ({app['total']} total)</li>"
+        yield "</ul>"
+
+def iter_html_report(data, rd_data, owner_summary, metrics_store=None):
+    """The report as a stream of HTML chunks; each section is generated as the template reaches it."""
+    template = get_format_template(HTML_TEMPLATE_PATH, CSS_STYLE_PATH)
+    
+    # `data` may already be an aggregate (e.g. built while streaming the CSV)
+    if isinstance(data, VulnerabilityAggregate):
+        aggregate = data
+    else:
+        with stage('aggregate_vulnerabilities') as record:
+            aggregate = VulnerabilityAggregate.from_rows(data)
+            record.rows = len(aggregate)
+    
+    total_vulnerabilities = aggregate.total
+    priority_count = aggregate.priority_count
+    
+    return template.iter_render(
+        executive_summary=iter_executive_summary(aggregate),
         total_vulnerabilities=total_vulnerabilities,
-        unique_vulnerabilities=unique_vulnerabilities,
-        affected_hosts=affected_hosts,
+        unique_vulnerabilities=aggregate.unique_vulnerabilities,
+        affected_hosts=aggregate.affected_hosts,
         priority_1_count=priority_count[PRIORITY_LEVELS[0]],
-        priority_1_percentage=priority_count[PRIORITY_LEVELS[0]]/total_vulnerabilities,
+        priority_1_percentage=share(priority_count[PRIORITY_LEVELS[0]], total_vulnerabilities),
         priority_2_count=priority_count[PRIORITY_LEVELS[1]],
-        priority_2_percentage=priority_count[PRIORITY_LEVELS[1]]/total_vulnerabilities,
+        priority_2_percentage=share(priority_count[PRIORITY_LEVELS[1]], total_vulnerabilities),
         priority_3_count=priority_count[PRIORITY_LEVELS[2]],
-        priority_3_percentage=priority_count[PRIORITY_LEVELS[2]]/total_vulnerabilities,
-        most_common_vulnerabilities=most_common_vulnerabilities,
-        vulnerable_hosts_by_priority=vulnerable_hosts_by_priority,
-        due_dates_by_priority=due_dates_by_priority,
-        vulnerabilities_by_app=vulnerabilities_by_app,
-        app_deliverables=app_deliverables_html
+        priority_3_percentage=share(priority_count[PRIORITY_LEVELS[2]], total_vulnerabilities),
+        most_common_vulnerabilities=iter_most_common_vulnerabilities(aggregate),
+        vulnerable_hosts_by_priority=iter_vulnerable_hosts_by_priority(aggregate),
+        due_dates_by_priority=iter_due_dates_by_priority(aggregate),
+        vulnerabilities_by_app=iter_vulnerabilities_by_app(aggregate),
+        application_risk=iter_application_risk(aggregate, rd_data),
+        trends=iter_trends(aggregate, metrics_store),
+        app_deliverables=iter_app_deliverables_html(rd_data, owner_summary)
     )
+
+def generate_html_report(data, rd_data, owner_summary, metrics_store=None):
+    return "".join(iter_html_report(data, rd_data, owner_summary, metrics_store))
+
+@instrumented()
+def write_html_report(sink, data, rd_data, owner_summary, metrics_store=None):
+    """Stream the report into any object with a `write(str)` method, e.g. an open file."""
+    batch = []
+    for chunk in iter_html_report(data, rd_data, owner_summary, metrics_store):
+        batch.append(chunk)
+        if len(batch) >= WRITE_BATCH_CHUNKS:
+            sink.write("".join(batch))
+            batch.clear()
+    sink.write("".join(batch))
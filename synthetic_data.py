@@ -0,0 +1,116 @@
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from config import (
+    COLUMN_SEVERITY_RISK, COLUMN_APPLICATION_ID, COLUMN_APPLICATION_FULL_NAME,
+    COLUMN_HOST_NAME, COLUMN_SOURCES, COLUMN_TITLE, COLUMN_DUE_DATE, DUE_DATE_FORMAT, PRIORITY_LEVELS
+)
+
+VULNERABILITY_COLUMNS = [
+    COLUMN_SEVERITY_RISK,
+    COLUMN_APPLICATION_ID,
+    COLUMN_APPLICATION_FULL_NAME,
+    COLUMN_HOST_NAME,
+    COLUMN_SOURCES,
+    COLUMN_TITLE,
+    COLUMN_DUE_DATE
+]
+
+DELIVERABLE_COLUMNS = ['App', 'AppID', 'AssignedToFullName', 'Deliverable Condition']
+
+DELIVERABLE_CONDITIONS = [
+    'Past Due with No Plan',
+    'Past Due with Plan',
+    'Due 0 to 10 Days',
+    'Due 11 to 30 Days',
+    'Due 31 to 90 Days',
+    'Completed'
+]
+
+# Rows are generated and written in batches of this size
+BATCH_SIZE = 10000
+
+class ZipfSampler:
+    """Draws keys 0..n-1 with probability proportional to 1 / (rank + 1) ** skew."""
+
+    def __init__(self, rng, n, skew=1.1):
+        self.rng = rng
+        self.keys = range(n)
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in self.keys))
+
+    def sample(self, k):
+        return self.rng.choices(self.keys, cum_weights=self.cum_weights, k=k)
+
+def distinct_counts(rows):
+    """Distinct apps, hosts, sources and titles scaled sub-linearly with the row count."""
+    return {
+        'apps': max(10, int(rows ** 0.5)),
+        'hosts': max(50, rows // 20),
+        'sources': max(10, int(rows ** 0.5) // 2),
+        'titles': max(20, int(rows ** 0.6))
+    }
+
+def generate_vulnerability_csv(path, rows, seed=0, today=None):
+    rng = random.Random(seed)
+    today = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = distinct_counts(rows)
+    apps = ZipfSampler(rng, counts['apps'])
+    hosts = ZipfSampler(rng, counts['hosts'], skew=0.9)
+    sources = ZipfSampler(rng, counts['sources'])
+    titles = ZipfSampler(rng, counts['titles'], skew=1.2)
+    # Each lower priority is about twice as common as the one above it
+    priority_weights = [2 ** level for level in range(len(PRIORITY_LEVELS))]
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(VULNERABILITY_COLUMNS)
+        remaining = rows
+        while remaining:
+            batch = min(BATCH_SIZE, remaining)
+            remaining -= batch
+            for app, host, source, title, priority in zip(
+                    apps.sample(batch), hosts.sample(batch), sources.sample(batch), titles.sample(batch),
+                    rng.choices(PRIORITY_LEVELS, weights=priority_weights, k=batch)):
+                # Roughly a third of findings come from a source rather than a host, a few from neither
+                kind = rng.random()
+                host_name = f'host{host:06d}.corp.example.com' if kind < 0.65 else ''
+                source_name = f'source-{source:04d}' if 0.6 < kind < 0.97 else ''
+                due = today + timedelta(days=rng.randint(-90, 200), seconds=rng.randint(0, 86399))
+                writer.writerow([
+                    priority,
+                    f'APP{app:05d}',
+                    f'Application {app}',
+                    host_name,
+                    source_name,
+                    f'Vulnerability {title}: outdated component',
+                    due.strftime(DUE_DATE_FORMAT)
+                ])
+
+def generate_deliverables_csv(path, rows, seed=0):
+    rng = random.Random(seed + 1)
+    counts = distinct_counts(rows)
+    apps = ZipfSampler(rng, counts['apps'])
+    owners = ZipfSampler(rng, max(10, counts['apps'] // 2), skew=0.8)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(DELIVERABLE_COLUMNS)
+        remaining = rows
+        while remaining:
+            batch = min(BATCH_SIZE, remaining)
+            remaining -= batch
+            for app, owner, condition in zip(apps.sample(batch), owners.sample(batch),
+                                             rng.choices(DELIVERABLE_CONDITIONS, weights=[1, 2, 2, 3, 4, 8], k=batch)):
+                writer.writerow([f'Application {app}', f'APP{app:05d}', f'Owner {owner}', condition])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic scanner and deliverables CSVs.')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--vulnerabilities', default='synthetic_vulnerabilities.csv')
+    parser.add_argument('--deliverables', default='synthetic_rd.csv')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_vulnerability_csv(args.vulnerabilities, args.rows, args.seed)
+    generate_deliverables_csv(args.deliverables, args.rows, args.seed)
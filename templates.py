@@ -0,0 +1,158 @@
+import os
+from collections.abc import Mapping
+from functools import lru_cache
+from string import Formatter
+from config import TEMPLATE_BYTECODE_CACHE_DIR
+
+# Template variable a `JinjaTemplate.render_context` mapping is passed under
+LAZY_CONTEXT_NAME = '_lazy_context'
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns
+
+@lru_cache(maxsize=32)
+def _read_text(path, mtime_ns):
+    with open(path, 'r') as f:
+        return f.read()
+
+def read_text(path):
+    """File contents, re-read only when the file's mtime changes."""
+    return _read_text(path, _mtime(path))
+
+class FormatTemplate:
+    """A `str.format` report template parsed once, with the stylesheet already bound.
+
+    `iter_render` streams the output: a field given as a non-string iterable (such as a
+    generator of section chunks) is emitted chunk by chunk instead of being joined first.
+    """
+
+    def __init__(self, template_text, styles):
+        self.text = template_text
+        self.styles = styles
+        self.pieces = list(Formatter().parse(template_text))
+
+    def render(self, **fields):
+        return "".join(self.iter_render(**fields))
+
+    def iter_render(self, **fields):
+        formatter = Formatter()
+        fields['styles'] = self.styles
+        for literal, field_name, format_spec, conversion in self.pieces:
+            if literal:
+                yield literal
+            if field_name is None:
+                continue
+            value = formatter.get_field(field_name, (), fields)[0]
+            if isinstance(value, str) and not format_spec and not conversion:
+                yield value
+            elif hasattr(value, '__iter__') and not isinstance(value, str) and not format_spec and not conversion:
+                yield from value
+            else:
+                yield formatter.format_field(formatter.convert_field(value, conversion), format_spec)
+
+    def render_many(self, field_sets):
+        for fields in field_sets:
+            yield self.render(**fields)
+
+class LazyContext(Mapping):
+    """Template variables computed on first lookup and then memoised.
+
+    `factories` maps each name to a zero-argument callable; a factory may look up other
+    names in the same context, so intermediate results are computed once and shared.
+    Names the template never looks up are never computed.
+    """
+
+    def __init__(self, factories, **values):
+        self.factories = factories
+        self.values = values
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            if name not in self.factories:
+                raise KeyError(name)
+            self.values[name] = self.factories[name]()
+        return self.values[name]
+
+    def __contains__(self, name):
+        return name in self.values or name in self.factories
+
+    def __iter__(self):
+        return iter({**self.factories, **self.values})
+
+    def __len__(self):
+        return len({**self.factories, **self.values})
+
+class JinjaTemplate:
+    """A Jinja2 template with the stylesheet already bound, for rendering many reports.
+
+    The environment keeps the compiled template in memory and its bytecode on disk, so
+    `get_template` here is a cache lookup that only recompiles after the file changes.
+    """
+
+    def __init__(self, environment, template_name, styles):
+        self.environment = environment
+        self.template_name = template_name
+        self.styles = styles
+
+    def render(self, **context):
+        return self.environment.get_template(self.template_name).render(styles=self.styles, **context)
+
+    def render_context(self, context, template=None):
+        """Render from any mapping without copying it first, so a `LazyContext` stays lazy.
+
+        `Template.render` builds a dict of its arguments, which would look up every name, so
+        the mapping is passed as one variable and the environment's `LazyTemplateContext`
+        looks names up in it only when the template uses them.
+        """
+        template = template or self.environment.get_template(self.template_name)
+        return template.render({LAZY_CONTEXT_NAME: context, 'styles': self.styles})
+
+    def render_many(self, contexts):
+        template = self.environment.get_template(self.template_name)
+        for context in contexts:
+            yield self.render_context(context, template)
+
+@lru_cache(maxsize=32)
+def _format_template(template_path, template_mtime, css_path, css_mtime):
+    return FormatTemplate(read_text(template_path), read_text(css_path))
+
+def get_format_template(template_path, css_path):
+    return _format_template(template_path, _mtime(template_path), css_path, _mtime(css_path))
+
+@lru_cache(maxsize=1)
+def _lazy_template_context():
+    # Imported here so the str.format report path does not need Jinja2 installed
+    from jinja2.runtime import Context, missing
+
+    class LazyTemplateContext(Context):
+        """A template context that falls back to the mapping passed as `LAZY_CONTEXT_NAME`.
+
+        Template variables and globals are resolved first, as usual; any other name is
+        looked up in the mapping, so a `LazyContext` only computes what the template uses.
+        """
+
+        def resolve_or_missing(self, key):
+            value = super().resolve_or_missing(key)
+            if value is missing and key != LAZY_CONTEXT_NAME:
+                context = super().resolve_or_missing(LAZY_CONTEXT_NAME)
+                if context is not missing and key in context:
+                    return context[key]
+            return value
+
+    return LazyTemplateContext
+
+@lru_cache(maxsize=4)
+def get_jinja_environment(search_path='.'):
+    # Imported here so the str.format report path does not need Jinja2 installed
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    os.makedirs(TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    environment = Environment(
+        loader=FileSystemLoader(search_path),
+        bytecode_cache=FileSystemBytecodeCache(TEMPLATE_BYTECODE_CACHE_DIR)
+    )
+    environment.context_class = _lazy_template_context()
+    return environment
+
+def get_jinja_template(template_name, css_path, search_path='.'):
+    return JinjaTemplate(get_jinja_environment(search_path), template_name, read_text(css_path))
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report_generation
+from data_processing import process_rd_csv
+from synthetic_data import generate_vulnerability_csv, generate_deliverables_csv
+
+FIXTURE_ROWS = 3000
+
+@pytest.fixture(autouse=True)
+def repository_templates(monkeypatch):
+    # config points the report at templates in the working directory; use the repository's
+    monkeypatch.setattr(report_generation, 'HTML_TEMPLATE_PATH', os.path.join(ROOT, 'report_template.html.html'))
+    monkeypatch.setattr(report_generation, 'CSS_STYLE_PATH', os.path.join(ROOT, 'outlook', 'report_styles.css'))
+
+@pytest.fixture
+def vulnerability_csv(tmp_path):
+    path = str(tmp_path / 'vulnerabilities.csv')
+    generate_vulnerability_csv(path, FIXTURE_ROWS, seed=1)
+    return path
+
+@pytest.fixture
+def deliverables(tmp_path):
+    path = str(tmp_path / 'deliverables.csv')
+    generate_deliverables_csv(path, FIXTURE_ROWS, seed=1)
+    return process_rd_csv(path)
+
+@pytest.fixture
+def render_report(deliverables):
+    rd_data, owner_summary = deliverables
+
+    def render(aggregate):
+        return report_generation.generate_html_report(aggregate, rd_data, owner_summary)
+    return render
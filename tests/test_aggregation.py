@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from aggregation import VulnerabilityAggregate, aggregate_csv
+from columnar import read_columnar_data
+from data_processing import read_csv_data
+from parallel import aggregate_csv_parallel
+
+def serialised(aggregate):
+    # Not sorted, so key order (which breaks ties in the report) is compared too
+    return json.dumps(aggregate.to_state())
+
+@pytest.fixture
+def rows_aggregate(vulnerability_csv):
+    return VulnerabilityAggregate.from_rows(read_csv_data(vulnerability_csv))
+
+@pytest.mark.parametrize('chunk_size', [1, 97, 100000])
+def test_streaming_matches_rows(vulnerability_csv, rows_aggregate, render_report, chunk_size):
+    streamed = aggregate_csv(vulnerability_csv, chunk_size)
+    assert serialised(streamed) == serialised(rows_aggregate)
+    assert render_report(streamed) == render_report(rows_aggregate)
+
+def test_columnar_matches_rows(vulnerability_csv, rows_aggregate, render_report):
+    columnar = VulnerabilityAggregate.from_table(read_columnar_data(vulnerability_csv))
+    assert serialised(columnar) == serialised(rows_aggregate)
+    assert render_report(columnar) == render_report(rows_aggregate)
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_parallel_matches_rows(vulnerability_csv, rows_aggregate, render_report, workers):
+    parallel = aggregate_csv_parallel(vulnerability_csv, workers)
+    assert serialised(parallel) == serialised(rows_aggregate)
+    assert render_report(parallel) == render_report(rows_aggregate)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from country_output import (
+    write_new_customers_by_country,
+    write_new_customers_by_country_chunks,
+)
+from customer_store import CustomerStore
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_chunked_output_matches_whole_file(tmp_path, chunk_size):
+    rng = np.random.default_rng(0)
+    rows = 120
+    balance = rng.integers(0, 50, rows).astype(float)
+    balance[[5, 77]] += 0.5
+    score = rng.integers(0, 5, rows).astype(float)
+    score[[3, 90]] = np.nan
+    new_data = pd.DataFrame(
+        {
+            "Customer Id": np.arange(rows),
+            "Country": rng.choice(["USA", "Canada", "Peru", "Chile"], rows),
+            "Balance": balance,
+            "Score": score,
+        }
+    )
+    csv_path = tmp_path / "customers.csv"
+    new_data.to_csv(csv_path, index=False)
+
+    whole_path = tmp_path / "whole.csv"
+    write_new_customers_by_country(pd.read_csv(csv_path), {"Peru"}, whole_path)
+
+    chunked_path = tmp_path / "chunked.csv"
+    with CustomerStore(str(tmp_path / "store.sqlite")) as store:
+        store.sync_chunks(pd.read_csv(csv_path, chunksize=chunk_size))
+        write_new_customers_by_country_chunks(
+            store.iter_new_records("Country", chunk_size),
+            {"Peru"},
+            chunked_path,
+            store.column_dtypes(),
+        )
+
+    assert chunked_path.read_text() == whole_path.read_text()
@@ -0,0 +1,47 @@
+import csv
+import json
+
+from aggregation import VulnerabilityAggregate
+from config import COLUMN_DUE_DATE, COLUMN_TITLE
+from data_processing import read_csv_data
+from incremental import refresh_aggregate
+
+def write_rows(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def assert_same_as_rebuild(aggregate, rows, render_report):
+    rebuilt = VulnerabilityAggregate.from_rows(rows)
+    # Serialised without sorting, so key order (which breaks ties in the report) is compared too
+    assert json.dumps(aggregate.to_state()) == json.dumps(rebuilt.to_state())
+    assert render_report(aggregate) == render_report(rebuilt)
+
+def test_refresh_matches_full_rebuild(tmp_path, vulnerability_csv, render_report):
+    csv_path = str(tmp_path / 'today.csv')
+    state_path = str(tmp_path / 'aggregate_state.json')
+    rows = [dict(row) for row in read_csv_data(vulnerability_csv)]
+
+    # The first 50 rows appear twice, so their keys have an earlier and a later copy
+    day1 = rows + [dict(row) for row in rows[:50]]
+    write_rows(csv_path, day1)
+    aggregate, delta = refresh_aggregate(csv_path, state_path)
+    assert delta.as_dict() == {'new': len(day1), 'changed': 0, 'deleted': 0, 'carryover': 0}
+    assert_same_as_rebuild(aggregate, day1, render_report)
+
+    # Drop the earlier copy of ten duplicated rows, edit 20 rows, add 15 and move a block
+    day2 = [dict(row) for row in day1[10:]]
+    for row in day2[100:120]:
+        row[COLUMN_DUE_DATE] = '2031-01-01 00:00:00'
+    day2 += [dict(row, **{COLUMN_TITLE: f'New finding {index}'}) for index, row in enumerate(rows[200:215])]
+    day2 = day2[:500] + day2[700:] + day2[500:700]
+    write_rows(csv_path, day2)
+    aggregate, delta = refresh_aggregate(csv_path, state_path)
+    assert delta.as_dict() == {'new': 15, 'changed': 20, 'deleted': 10, 'carryover': len(day2) - 15}
+    assert_same_as_rebuild(aggregate, day2, render_report)
+
+    # An unchanged export touches nothing
+    aggregate, delta = refresh_aggregate(csv_path, state_path)
+    assert delta.as_dict() == {'new': 0, 'changed': 0, 'deleted': 0, 'carryover': len(day2)}
+    assert_same_as_rebuild(aggregate, day2, render_report)
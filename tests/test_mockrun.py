@@ -0,0 +1,47 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import mockrun
+
+
+def write_days(directory, days, seed=0):
+    """Daily customer files with customers added, carried over, modified and removed."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(200)
+    paths = []
+    for day in range(days):
+        ids = np.union1d(
+            rng.choice(ids, size=len(ids) * 4 // 5, replace=False),
+            np.arange(200 + day * 60, 260 + day * 60),
+        )
+        frame = pd.DataFrame(
+            {
+                "Customer Id": ids,
+                "Country": rng.choice(["USA", "Canada", "Peru", f"Land {day}"], len(ids)),
+                "Score": rng.integers(0, 3, len(ids)),
+            }
+        )
+        path = directory / f"customers_2024010{day + 1}.csv"
+        frame.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_backfill_matches_daily_runs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = write_days(tmp_path, 4)
+    assert mockrun.check_backfill(paths) == []
+
+
+def test_summaries_are_dated_from_file_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = write_days(tmp_path, 3)
+    mockrun.backfill(paths)
+    summaries = pd.read_csv(mockrun.summary_file_path)
+    assert list(summaries["Date"]) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert mockrun.summary_dates(["day_1.csv", "day_2.csv"], date(2024, 2, 28)) == [
+        date(2024, 2, 28),
+        date(2024, 2, 29),
+    ]
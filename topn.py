@@ -0,0 +1,121 @@
+import heapq
+from itertools import count as sequence
+from operator import itemgetter
+
+def top_n(counts, n, key=itemgetter(1)):
+    """The `n` largest (key, count) items of a mapping without sorting every key.
+
+    `heapq.nlargest` keeps an n-item heap, so this is O(k log n) for k keys; ties keep the
+    mapping's order, exactly as `sorted(..., reverse=True)[:n]` and `Counter.most_common(n)`.
+    With `n` None every item is returned, fully sorted.
+    """
+    if n is None:
+        return sorted(counts.items(), key=key, reverse=True)
+    return heapq.nlargest(n, counts.items(), key=key)
+
+class SpaceSaving:
+    """Bounded-memory heavy-hitter counts (Metwally et al.'s Space-Saving algorithm).
+
+    At most `capacity` keys are monitored. An unmonitored key arriving when the summary is
+    full replaces the key with the smallest count and inherits that count as its error, so
+    every estimate `c` satisfies `true <= c <= true + error(key)`, and the error is never
+    more than `total / capacity`. Any key truly seen more than `total / capacity` times is
+    guaranteed to be monitored.
+
+    Reads and writes look like a Counter so `summary[key] += 1` works unchanged; assigning
+    to an unmonitored key when full evicts the minimum and adds the increment on top of it.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._order = {}
+        self._sequence = sequence()
+        # One (count, order, key) entry per monitored key; counts may lag behind `counts`
+        self._heap = []
+
+    def __getitem__(self, key):
+        return self.counts.get(key, 0)
+
+    def __setitem__(self, key, value):
+        current = self.counts.get(key)
+        if current is not None:
+            self.total += value - current
+            self.counts[key] = value
+            return
+        self.total += value
+        error = 0
+        if len(self.counts) >= self.capacity:
+            error = self._evict_minimum()
+            value += error
+        self._monitor(key, value, error)
+
+    def _monitor(self, key, value, error):
+        self.counts[key] = value
+        self.errors[key] = error
+        order = self._order[key] = next(self._sequence)
+        heapq.heappush(self._heap, (value, order, key))
+
+    def _evict_minimum(self):
+        while True:
+            value, order, key = self._heap[0]
+            current = self.counts[key]
+            if current == value:
+                heapq.heappop(self._heap)
+                del self.counts[key], self.errors[key], self._order[key]
+                return value
+            # Stale entry: the key was incremented after it was pushed
+            heapq.heapreplace(self._heap, (current, order, key))
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def error(self, key):
+        """How far the estimate for `key` can exceed its true count."""
+        return self.errors.get(key, self.minimum())
+
+    def minimum(self):
+        """Upper bound on the true count of any key that is not monitored."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def error_bound(self):
+        return self.total / self.capacity
+
+    def most_common(self, n=None):
+        """(key, estimated count) pairs, highest first; ties keep first-monitored order."""
+        order = self._order
+        return heapq.nlargest(len(self.counts) if n is None else n, self.counts.items(),
+                              key=lambda item: (item[1], -order[item[0]]))
+
+    def most_common_with_errors(self, n=None):
+        return [(key, value, self.errors[key]) for key, value in self.most_common(n)]
+
+    def update(self, other):
+        """Merge another summary into this one (Agarwal et al.'s mergeable summaries).
+
+        A key missing from one side may still have been seen up to that side's minimum
+        count, so the minimum is added to both its estimate and its error.
+        """
+        own_minimum, other_minimum = self.minimum(), other.minimum()
+        counts = {key: value + other.counts.get(key, other_minimum) for key, value in self.counts.items()}
+        errors = {key: error + other.errors.get(key, other_minimum) for key, error in self.errors.items()}
+        for key, value in other.counts.items():
+            if key not in counts:
+                counts[key] = value + own_minimum
+                errors[key] = other.errors[key] + own_minimum
+        total = self.total + other.total
+        kept = {key for key, _ in top_n(counts, self.capacity)}
+
+        self.counts, self.errors, self._order, self._heap = {}, {}, {}, []
+        for key, value in counts.items():
+            if key in kept:
+                self._monitor(key, value, errors[key])
+        self.total = total
+        return self